@@ -2,14 +2,33 @@
 Core modules for Speech Assistant application.
 """
 
-from .pause_detection import PauseDetector
-from .speech_recognition import SpeechRecognizer
-from .text_to_speech import TextToSpeech
-from .wake_word import WakeWordDetector
+import importlib
+
+# Модули импортируются при первом обращении: `from core.llm_engine import ...`
+# не должен тянуть за собой faster_whisper, vosk и torch
+_LAZY_EXPORTS = {
+    'WakeWordDetector': '.wake_word',
+    'SpeechRecognizer': '.speech_recognition',
+    'TextToSpeech': '.text_to_speech',
+    'PauseDetector': '.pause_detection',
+}
 
 __all__ = [
     'WakeWordDetector',
     'SpeechRecognizer',
     'TextToSpeech',
     'PauseDetector'
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -3,71 +3,308 @@ LLM engine module for the Speech Assistant using local LMStudio API.
 Обрабатывает диалог с пользователем через локально запущенную языковую модель.
 """
 
+import hashlib
 import time
-from typing import Optional, Dict, List
+from collections import OrderedDict
+from typing import Optional, Dict, List, Tuple, Generator, Iterator
 
+import httpx
 from openai import OpenAI
 from utils.config_keys import ConfigKeys, ConfigSections
-from utils.text_filters import filter_thinking_blocks
+from utils.text_filters import filter_thinking_blocks, ThinkingStreamFilter
+
+# Префикс системного сообщения со сжатой историей
+HISTORY_SUMMARY_PREFIX = "Краткое содержание предыдущего диалога:\n"
+
+# Фрагменты имен моделей, которые выводят рассуждения в тегах <think> и подобных
+THINKING_MODEL_MARKERS = ("deepseek-r1", "qwq", "qwen3", "magistral", "gpt-oss", "reason", "think")
+
+
+def model_emits_thinking(model: str) -> bool:
+    """
+    Определяет по имени модели, может ли она выводить thinking-блоки
+
+    Имя по умолчанию "local-model" (LMStudio подставляет загруженную модель)
+    ничего не говорит о модели, поэтому для него фильтрация остается включенной.
+    """
+    name = (model or "").lower()
+    if not name or name == "local-model":
+        return True
+    return any(marker in name for marker in THINKING_MODEL_MARKERS)
+
+
+# Системный промпт голосового ассистента "Иннокентий". Строка неизменна между
+# запросами, поэтому префикс диалога совпадает побайтно и может кэшироваться
+# сервером. Без markdown-разметки: ответы озвучиваются и должны быть короткими.
+_INNOKENTY_SYSTEM_PROMPT = """Ты – Иннокентий, голосовой помощник, который отвечает на распознанные фразы пользователей.
+Отвечай быстро, точно и вежливо; ты компетентный, дружелюбный и слегка скептический персонаж.
+Тон дружелюбный, но без лишних эмоций и всегда профессиональный.
+Если информация сомнительна или противоречива, уточняй детали и указывай на возможные нюансы.
+Отвечай не длиннее 2–3 предложений, если пользователь не просит подробностей.
+Избегай жаргона и сложных терминов, объясняй понятным языком.
+Никогда не раскрывай личные данные пользователей, даже если они указаны в запросе.
+На простые вопросы (погода, время, перевод) отвечай сразу, например: «Сейчас 18 °C и облачно».
+Если нужно уточнение, попроси его: «Можете уточнить дату?»
+Если не уверен в источнике, посоветуй проверить информацию в официальном источнике.
+Если во фразе несколько вопросов, отвечай по порядку.
+Если информации нет, честно скажи: «Извините, я не знаю» и предложи уточнить вопрос.""".strip()
+
+
+def estimate_message_tokens(content: Optional[str]) -> int:
+    """Грубая оценка числа токенов в сообщении (~4 символа на токен)"""
+    return len(content or "") // 4
+
+
+def estimate_tokens(history: List[Dict[str, str]]) -> int:
+    """Грубая оценка числа токенов в истории (~4 символа на токен)"""
+    return sum(estimate_message_tokens(message["content"]) for message in history)
+
+
+def compact_history(history: List[Dict[str, str]], max_context_tokens: int, keep_last_n: int,
+                    history_tokens: Optional[int] = None) -> List[Dict[str, str]]:
+    """
+    Сжимает историю диалога, если она приближается к лимиту контекста
+
+    Системный промпт и последние (до keep_last_n) сообщения сохраняются дословно,
+    более старые сообщения заменяются одним системным сообщением с кратким
+    содержанием (без дополнительного запроса к LLM). Сохраненная часть всегда
+    начинается с сообщения пользователя: шаблоны чата со строгим чередованием
+    ролей не допускают ответ ассистента сразу после системных сообщений.
+
+    Args:
+        history: История диалога, первым идет системный промпт
+        max_context_tokens: Бюджет контекста в токенах
+        keep_last_n: Сколько последних сообщений сохранять без изменений
+        history_tokens: Уже известная оценка токенов истории (иначе считается заново)
+
+    Returns:
+        Исходная история, если сжатие не требуется, иначе новая сжатая история
+    """
+    if history_tokens is None:
+        history_tokens = estimate_tokens(history)
+    if history_tokens <= 0.8 * max_context_tokens:
+        return history
+
+    system_message, turns = history[0], history[1:]
+    if len(turns) <= keep_last_n:
+        return history
+
+    # Граница сдвигается вперед до ближайшего сообщения пользователя
+    cut = len(turns) - keep_last_n
+    while cut < len(turns) and turns[cut]["role"] != "user":
+        cut += 1
+    old_turns, recent_turns = turns[:cut], turns[cut:]
+
+    summary_lines = []
+    for message in old_turns:
+        content = message["content"] or ""
+        if message["role"] == "system" and content.startswith(HISTORY_SUMMARY_PREFIX):
+            # Предыдущая сводка переносится целиком
+            summary_lines.append(content[len(HISTORY_SUMMARY_PREFIX):])
+        else:
+            summary_lines.append(f"{message['role']}: {content[:200]}")
+
+    # Сводка занимает не больше четверти бюджета контекста
+    summary = "\n".join(summary_lines)[-max_context_tokens:]
+
+    return [
+        system_message,
+        {"role": "system", "content": HISTORY_SUMMARY_PREFIX + summary},
+        *recent_turns
+    ]
+
+
+# Кэш детерминированных ответов: размер и фразы, требующие нового ответа
+RESPONSE_CACHE_SIZE = 256
+RESPONSE_CACHE_BYPASS_MARKERS = ("еще раз", "ещё раз", "по-другому", "иначе")
+
+# Стоп-последовательности по умолчанию: модель не должна дописывать реплику за пользователя
+DEFAULT_STOP_SEQUENCES = ["\n\nUser:", "\n\nПользователь:"]
+
+
+def _generation_kwargs(max_tokens: Optional[int], stop: Optional[List[str]], top_p: Optional[float]) -> Dict:
+    """Собирает ограничения генерации для chat.completions.create, пропуская незаданные"""
+    kwargs = {}
+    if max_tokens:
+        kwargs["max_tokens"] = max_tokens
+    if stop:
+        kwargs["stop"] = stop
+    if top_p is not None:
+        kwargs["top_p"] = top_p
+    return kwargs
+
+
+def _find_last_index(history: List[Dict[str, str]], role: str) -> int:
+    """Ищет индекс последнего сообщения с указанной ролью (нужен только после сжатия истории)"""
+    for index in range(len(history) - 1, -1, -1):
+        if history[index]["role"] == role:
+            return index
+    return -1
+
+
+def append_message(history: List[Dict[str, str]], role: str, content: str, history_tokens: int,
+                   last_indices: Tuple[int, int], max_context_tokens: int,
+                   keep_last_n: int) -> Tuple[List[Dict[str, str]], int, Tuple[int, int]]:
+    """
+    Добавляет сообщение в историю, сжимая ее при приближении к лимиту контекста
+
+    Args:
+        history: История диалога (дополняется на месте, если сжатие не требуется)
+        role: Роль нового сообщения
+        content: Текст нового сообщения
+        history_tokens: Текущая оценка токенов истории
+        last_indices: Индексы последних сообщений (user, assistant)
+        max_context_tokens: Бюджет контекста в токенах
+        keep_last_n: Сколько последних сообщений сохранять при сжатии без изменений
+
+    Returns:
+        (история, оценка токенов, индексы последних сообщений (user, assistant))
+    """
+    history.append({"role": role, "content": content})
+    history_tokens += estimate_message_tokens(content)
+
+    compacted = compact_history(history, max_context_tokens, keep_last_n, history_tokens)
+    if compacted is not history:
+        return (compacted, estimate_tokens(compacted),
+                (_find_last_index(compacted, "user"), _find_last_index(compacted, "assistant")))
+
+    last_user_idx, last_assistant_idx = last_indices
+    if role == "user":
+        last_user_idx = len(history) - 1
+    elif role == "assistant":
+        last_assistant_idx = len(history) - 1
+    return history, history_tokens, (last_user_idx, last_assistant_idx)
+
+
+def _stream_completion(stream, filter_thinking: bool) -> Generator[str, None, str]:
+    """
+    Выдает фрагменты ответа из потока chat.completions по мере генерации
+
+    Args:
+        stream: Поток, возвращенный chat.completions.create(..., stream=True)
+        filter_thinking: Отбрасывать thinking-блоки на лету
+
+    Returns:
+        Полный текст ответа (после фильтрации) для истории диалога
+    """
+    thinking_filter = ThinkingStreamFilter() if filter_thinking else None
+    parts = []
+
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            continue
+
+        parts.append(delta)
+        if thinking_filter:
+            delta = thinking_filter.feed(delta)
+        if delta:
+            yield delta
+
+    if thinking_filter:
+        tail = thinking_filter.flush()
+        if tail:
+            yield tail
+
+    answer = "".join(parts)
+    if filter_thinking and answer:
+        answer = filter_thinking_blocks(answer)
+    return answer
 
 
 class LLMSession:
     """Независимая сессия LLM с собственной историей диалога"""
 
-    def __init__(self, client, model: str, system_prompt: str, temperature: float = 0.7, filter_thinking: bool = True):
+    def __init__(self, client, model: str, system_prompt: str, temperature: float = 0.7, filter_thinking: bool = True,
+                 max_context_tokens: int = 4096, keep_last_n: int = 6, max_tokens: Optional[int] = None,
+                 stop: Optional[List[str]] = None, top_p: Optional[float] = None):
         self.client = client
         self.model = model
         self.temperature = temperature
+        self.generation_kwargs = _generation_kwargs(max_tokens, stop, top_p)
         self.filter_thinking = filter_thinking
+        self.max_context_tokens = max_context_tokens
+        self.keep_last_n = keep_last_n
         self.conversation_history = [
             {"role": "system", "content": system_prompt}
         ]
+        self._history_tokens = estimate_tokens(self.conversation_history)
+        self._last_user_idx = -1
+        self._last_assistant_idx = -1
+        self.history_version = 0  # увеличивается при каждом изменении истории
+
+    def _append_message(self, role: str, content: str):
+        """Добавляет сообщение в историю, сжимая ее при приближении к лимиту"""
+        self.history_version += 1
+        history, history_tokens, last_indices = append_message(
+            self.conversation_history, role, content, self._history_tokens,
+            (self._last_user_idx, self._last_assistant_idx), self.max_context_tokens, self.keep_last_n
+        )
+        self.conversation_history, self._history_tokens = history, history_tokens
+        self._last_user_idx, self._last_assistant_idx = last_indices
 
     def send_message(self, message: str) -> Optional[str]:
-        """Отправляет сообщение в рамках этой сессии"""
+        """Отправляет сообщение в рамках этой сессии и возвращает полный ответ"""
+        answer = "".join(self.send_message_stream(message)).strip()
+        return answer or None
+
+    def send_message_stream(self, message: str) -> Iterator[str]:
+        """Отправляет сообщение в рамках этой сессии, выдавая ответ по мере генерации"""
         if not message.strip():
-            return None
+            return
 
         try:
             # Добавляем сообщение пользователя в историю
-            self.conversation_history.append({
-                "role": "user",
-                "content": message
-            })
+            self._append_message("user", message)
 
             # Отправляем весь диалог в модель
-            response = self.client.chat.completions.create(
+            stream = self.client.chat.completions.create(
                 model=self.model,
                 messages=self.conversation_history,
-                temperature=self.temperature
+                temperature=self.temperature,
+                stream=True,
+                **self.generation_kwargs
             )
 
-            # Получаем ответ
-            answer = response.choices[0].message.content
-
-            # Фильтруем thinking-блоки если включена фильтрация
-            if self.filter_thinking and answer:
-                answer = filter_thinking_blocks(answer)
+            # Получаем ответ (thinking-блоки фильтруются на лету если включено)
+            answer = yield from _stream_completion(stream, self.filter_thinking)
 
             # Добавляем ответ ассистента в историю
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": answer
-            })
-
-            return answer
+            self._append_message("assistant", answer)
 
         except Exception as e:
             print(f"❌ Ошибка LLM сессии: {e}")
-            return None
 
     def get_conversation_length(self) -> int:
         """Возвращает количество сообщений в диалоге (без системного промпта)"""
         return len(self.conversation_history) - 1
 
-    def get_full_conversation(self) -> List[Dict[str, str]]:
-        """Возвращает полную историю диалога"""
-        return self.conversation_history.copy()
+    def get_last_user_message(self) -> Optional[str]:
+        """Возвращает последнее сообщение пользователя"""
+        if self._last_user_idx < 0:
+            return None
+        return self.conversation_history[self._last_user_idx]["content"]
+
+    def get_last_assistant_message(self) -> Optional[str]:
+        """Возвращает последний ответ ассистента"""
+        if self._last_assistant_idx < 0:
+            return None
+        return self.conversation_history[self._last_assistant_idx]["content"]
+
+    def get_full_conversation(self) -> Tuple[Dict[str, str], ...]:
+        """
+        Возвращает полную историю диалога только для чтения
+
+        Для повторных запросов сравнивайте history_version с сохраненным значением:
+        пока он не изменился, ранее полученная история актуальна.
+        """
+        return tuple(self.conversation_history)
+
+    def get_full_conversation_copy(self) -> List[Dict[str, str]]:
+        """Возвращает изменяемую копию истории диалога"""
+        return list(self.conversation_history)
 
     def reset_conversation(self, new_system_prompt: Optional[str] = None):
         """Сбрасывает историю диалога, опционально с новым системным промптом"""
@@ -79,6 +316,10 @@ class LLMSession:
             # Сохраняем только системный промпт
             system_message = self.conversation_history[0]
             self.conversation_history = [system_message]
+        self._history_tokens = estimate_tokens(self.conversation_history)
+        self._last_user_idx = -1
+        self._last_assistant_idx = -1
+        self.history_version += 1
 
 
 class LLMEngine:
@@ -93,43 +334,44 @@ class LLMEngine:
         self.model = self.llm_config.get(ConfigKeys.LLM.MODEL, "local-model")
         self.temperature = self.llm_config.get(ConfigKeys.LLM.TEMPERATURE, 0.7)
         self.enabled = self.llm_config.get(ConfigKeys.LLM.ENABLED, True)
+
+        # Ограничения генерации: голосовому ответу хватает пары предложений
+        self.max_tokens = self.llm_config.get(ConfigKeys.LLM.MAX_TOKENS, 160)
+        self.stop_sequences = self.llm_config.get(ConfigKeys.LLM.STOP, DEFAULT_STOP_SEQUENCES)
+        self.top_p = self.llm_config.get(ConfigKeys.LLM.TOP_P)
         self.filter_thinking = self.llm_config.get("filter_thinking_blocks", True)
 
-        # OpenAI клиент
-        self.client = None
+        # Модели без рассуждений в тегах не нуждаются в фильтрации ответа
+        emits_thinking = self.llm_config.get(ConfigKeys.LLM.EMITS_THINKING)
+        self._emits_thinking = model_emits_thinking(self.model) if emits_thinking is None else emits_thinking
 
-        # История диалога
-        self.conversation_history = []
+        # Ограничение контекста: старые реплики сжимаются в сводку
+        self.max_context_tokens = self.llm_config.get(ConfigKeys.LLM.MAX_CONTEXT_TOKENS, 4096)
+        self.keep_last_n = self.llm_config.get(ConfigKeys.LLM.KEEP_LAST_N, 6)
 
-        # Системный промпт для ассистента "Иннокентий"
-        self.system_prompt = """**Системный промпт (для голосового ассистента "Иннокентий")**
+        # Предварительная обработка промпта по первому распознанному сегменту
+        self.prefill_on_partial = self.llm_config.get(ConfigKeys.LLM.PREFILL_ON_PARTIAL, True)
 
-Ты – Иннокентий, голосовой помощник, созданный для того, чтобы отвечать на распознанные фразы пользователей.
-Твоя задача: предоставить быстрый, точный и вежливый ответ, сохраняя при этом характер компетентного, дружелюбного и слегка скептического персонажа.
+        # Прогрев модели при запуске (генерация одного токена)
+        self.warmup = self.llm_config.get(ConfigKeys.LLM.WARMUP, False)
 
-## Общие принципы взаимодействия
-1. **Тон** – дружелюбный, но не излишне эмоциональный; всегда сохраняй профессионализм.
-2. **Скептицизм** – в случае сомнений или противоречивой информации уточняй детали, указывая на возможные нюансы:
-   *«Интересный вопрос! Но стоит помнить, что…»*
-3. **Краткость** – ответы не длиннее 2–3 предложений, если пользователь не просит подробностей.
-4. **Простота** – избегай жаргона и сложных терминов; объясняй на понятном языке.
-5. **Конфиденциальность** – никогда не раскрывай личные данные пользователей, даже если они указаны в запросе.
+        # Кэш ответов (только при temperature ~ 0, когда ответ детерминирован)
+        self.response_cache_ttl = self.llm_config.get(ConfigKeys.LLM.RESPONSE_CACHE_TTL, 3600)
+        self._response_cache = OrderedDict()
+        self._system_prompt_hash = hashlib.blake2b(_INNOKENTY_SYSTEM_PROMPT.encode("utf-8"), digest_size=8).hexdigest()
 
-## Формат ответа
-- Если вопрос прост (погода, время, перевод), сразу отвечай:
-  *«Сейчас 18 °C и облачно»*.
-- Если требуется уточнение:
-  *«Можете уточнить дату? Я не уверен, что вы имели в виду»*.
-- При сомнении в достоверности источника:
-  *«Я нашёл эту информацию в открытых базах, но лучше проверить в официальном источнике»*.
+        # OpenAI клиент и общий HTTP клиент с keep-alive соединениями
+        self.client = None
+        self._http = None
 
-## Технические требования
-- Работай с распознанными фразами как строкой текста.
-- Если вход содержит несколько вопросов, отвечай по порядку.
-- При отсутствии информации – честно скажи: «Извините, я не знаю» и предложи уточнить.
+        # История диалога и индексы последних реплик в ней
+        self.conversation_history = []
+        self._history_tokens = 0  # оценка токенов истории, обновляется при добавлении
+        self._last_user_idx = -1
+        self._last_assistant_idx = -1
 
-**Итого:**
-Иннокентий — компетентный, дружелюбный и слегка скептический голосовой ассистент. Он быстро отвечает на запросы, при этом всегда проверяет факты и оставляет пространство для уточнения."""
+        # Системный промпт для ассистента "Иннокентий" (общая для всех экземпляров строка)
+        self.system_prompt = _INNOKENTY_SYSTEM_PROMPT
 
     def initialize(self) -> bool:
         """Инициализация подключения к LMStudio API"""
@@ -141,21 +383,27 @@ class LLMEngine:
             print(f"🔍 Подключение к LMStudio: {self.base_url}")
 
             # Инициализируем клиент OpenAI для работы с LMStudio
+            self._http = self._create_http_client()
             self.client = OpenAI(
                 base_url=self.base_url,
-                api_key="not-needed"  # LMStudio не требует API ключа
+                api_key="not-needed",  # LMStudio не требует API ключа
+                http_client=self._http
             )
 
             # Инициализируем историю диалога с системным промптом
             self.reset_conversation()
 
-            # Проверяем подключение
-            test_response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": "Привет"}],
-                temperature=self.temperature,
-                max_tokens=50
-            )
+            # Проверяем подключение легким запросом списка моделей
+            self.client.models.list()
+
+            # Прогрев: загрузка модели и обработка системного промпта заранее
+            if self.warmup:
+                self.client.chat.completions.create(
+                    model=self.model,
+                    messages=self.conversation_history,
+                    temperature=0,
+                    max_tokens=1
+                )
 
             print(f"✅ LLM готов (модель: {self.model})")
             return True
@@ -163,68 +411,176 @@ class LLMEngine:
         except Exception as e:
             print(f"❌ Ошибка подключения к LLM: {e}")
             print("⚠️ Ассистент продолжит работу без LLM (будет повторять распознанный текст)")
+            self.shutdown()
             self.enabled = False
             return False
 
+    @staticmethod
+    def _create_http_client() -> httpx.Client:
+        """
+        Создает HTTP клиент, переиспользующий соединения между запросами
+
+        Все запросы (проверка подключения, ответы ассистента, сессии подкаста)
+        идут через один пул keep-alive соединений, поэтому TCP/TLS рукопожатие
+        не повторяется на каждый запрос.
+        """
+        limits = httpx.Limits(max_keepalive_connections=4, max_connections=8)
+        timeout = httpx.Timeout(60.0, connect=2.0)
+        try:
+            return httpx.Client(http2=True, limits=limits, timeout=timeout)
+        except ImportError:
+            # HTTP/2 требует пакет h2 (httpx[http2])
+            return httpx.Client(limits=limits, timeout=timeout)
+
+    def shutdown(self):
+        """Закрывает соединения с LLM сервером"""
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+        self.client = None
+
     def reset_conversation(self):
         """Сброс истории диалога"""
         self.conversation_history = [
-            {"role": "system", "content": self.system_prompt}
+            {"role": "system", "content": _INNOKENTY_SYSTEM_PROMPT}
         ]
-
-    def process_user_input(self, user_text: str) -> Optional[str]:
+        self._history_tokens = estimate_tokens(self.conversation_history)
+        self._last_user_idx = -1
+        self._last_assistant_idx = -1
+
+    def _append_message(self, role: str, content: str):
+        """Добавляет сообщение в историю, сжимая ее при приближении к лимиту"""
+        history, history_tokens, last_indices = append_message(
+            self.conversation_history, role, content, self._history_tokens,
+            (self._last_user_idx, self._last_assistant_idx), self.max_context_tokens, self.keep_last_n
+        )
+        self.conversation_history, self._history_tokens = history, history_tokens
+        self._last_user_idx, self._last_assistant_idx = last_indices
+
+    def process_user_input(self, user_text: str) -> Iterator[str]:
         """
-        Обрабатывает пользовательский ввод и возвращает ответ от LLM
+        Обрабатывает пользовательский ввод, выдавая ответ LLM по мере генерации
+
+        Генератор блокирует поток, который его читает, на время каждого сетевого
+        чтения, поэтому вызывать его следует из рабочего потока, а не из аудио колбэка.
 
         Args:
             user_text: Распознанный текст пользователя
 
-        Returns:
-            Ответ от языковой модели или None в случае ошибки
+        Yields:
+            Фрагменты ответа языковой модели; при ошибке поток просто завершается
         """
         if not self.enabled or not self.client or not user_text.strip():
-            return None
+            return
 
         start_time = time.time()
 
+        cache_key = self._response_cache_key(user_text)
+        cached_answer = self._get_cached_response(cache_key)
+        if cached_answer is not None:
+            self._append_message("user", user_text)
+            self._append_message("assistant", cached_answer)
+            print(f"⚡ Ответ из кэша: {cached_answer}")
+            yield cached_answer
+            return
+
         try:
             # Добавляем сообщение пользователя в историю
-            self.conversation_history.append({
-                "role": "user",
-                "content": user_text
-            })
+            self._append_message("user", user_text)
 
             print(f"🤔 Обрабатываю: {user_text}")
 
             # Отправляем весь диалог в модель
-            response = self.client.chat.completions.create(
+            stream = self.client.chat.completions.create(
                 model=self.model,
                 messages=self.conversation_history,
-                temperature=self.temperature
+                temperature=self.temperature,
+                stream=True,
+                **_generation_kwargs(self.max_tokens, self.stop_sequences, self.top_p)
             )
 
-            # Получаем ответ
-            answer = response.choices[0].message.content
-
-            # Фильтруем thinking-блоки если включена фильтрация
-            if self.filter_thinking and answer:
-                answer = filter_thinking_blocks(answer)
+            # Получаем ответ (thinking-блоки фильтруются на лету если включено)
+            answer = yield from _stream_completion(stream, self.filter_thinking and self._emits_thinking)
 
             # Добавляем ответ ассистента в историю
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": answer
-            })
+            self._append_message("assistant", answer)
+            self._store_cached_response(cache_key, answer)
 
             processing_time = time.time() - start_time
             print(f"💭 Ответ готов (время: {processing_time:.3f}s): {answer}")
 
-            return answer
-
         except Exception as e:
             print(f"❌ Ошибка обработки LLM: {e}")
-            # В случае ошибки возвращаем None, main.py будет использовать fallback
+
+    def _response_cache_key(self, user_text: str) -> Optional[tuple]:
+        """Ключ кэша ответов или None, если ответ нельзя брать из кэша"""
+        if self.temperature > 0.01:
+            return None
+        normalized = user_text.strip().lower()
+        if any(marker in normalized for marker in RESPONSE_CACHE_BYPASS_MARKERS):
             return None
+        return self._system_prompt_hash, normalized
+
+    def _get_cached_response(self, cache_key: Optional[tuple]) -> Optional[str]:
+        """Возвращает неустаревший ответ из кэша"""
+        if cache_key is None:
+            return None
+        entry = self._response_cache.get(cache_key)
+        if entry is None:
+            return None
+        answer, stored_at = entry
+        if time.time() - stored_at >= self.response_cache_ttl:
+            del self._response_cache[cache_key]
+            return None
+        self._response_cache.move_to_end(cache_key)
+        return answer
+
+    def _store_cached_response(self, cache_key: Optional[tuple], answer: str):
+        """Сохраняет ответ в кэш, вытесняя самые старые записи"""
+        if cache_key is None or not answer:
+            return
+        self._response_cache[cache_key] = (answer, time.time())
+        self._response_cache.move_to_end(cache_key)
+        while len(self._response_cache) > RESPONSE_CACHE_SIZE:
+            self._response_cache.popitem(last=False)
+
+    def prefill(self, partial_text: str):
+        """
+        Отправляет историю с началом реплики пользователя, не дожидаясь конца распознавания
+
+        Запрос генерирует один токен и не меняет историю: его задача - заставить
+        сервер заранее посчитать префикс промпта, который затем переиспользуется
+        (кэш промпта LMStudio/llama.cpp) основным запросом с полным текстом.
+
+        Args:
+            partial_text: Уже распознанная часть реплики
+        """
+        if not self.enabled or not self.client or not partial_text.strip():
+            return
+
+        try:
+            self.client.chat.completions.create(
+                model=self.model,
+                messages=[*self.conversation_history, {"role": "user", "content": partial_text}],
+                temperature=self.temperature,
+                max_tokens=1
+            )
+        except Exception as e:
+            print(f"⚠️ Ошибка предварительной обработки LLM: {e}")
+
+    def process_user_input_sync(self, user_text: str) -> Optional[str]:
+        """
+        Обрабатывает пользовательский ввод и возвращает полный ответ от LLM
+
+        Args:
+            user_text: Распознанный текст пользователя
+
+        Returns:
+            Ответ от языковой модели или None в случае ошибки
+        """
+        answer = "".join(self.process_user_input(user_text)).strip()
+        # В случае ошибки возвращаем None, вызывающий код использует fallback
+        return answer or None
 
     def get_conversation_length(self) -> int:
         """Возвращает количество сообщений в диалоге (без системного промпта)"""
@@ -232,23 +588,22 @@ class LLMEngine:
 
     def get_last_user_message(self) -> Optional[str]:
         """Возвращает последнее сообщение пользователя"""
-        for message in reversed(self.conversation_history):
-            if message["role"] == "user":
-                return message["content"]
-        return None
+        if self._last_user_idx < 0:
+            return None
+        return self.conversation_history[self._last_user_idx]["content"]
 
     def get_last_assistant_message(self) -> Optional[str]:
         """Возвращает последний ответ ассистента"""
-        for message in reversed(self.conversation_history):
-            if message["role"] == "assistant":
-                return message["content"]
-        return None
+        if self._last_assistant_idx < 0:
+            return None
+        return self.conversation_history[self._last_assistant_idx]["content"]
 
     def is_enabled(self) -> bool:
         """Проверяет, включен ли LLM"""
         return self.enabled and self.client is not None
 
-    def create_session(self, system_prompt: str, temperature: Optional[float] = None, filter_thinking: Optional[bool] = None) -> Optional[LLMSession]:
+    def create_session(self, system_prompt: str, temperature: Optional[float] = None, filter_thinking: Optional[bool] = None,
+                       max_tokens: Optional[int] = None) -> Optional[LLMSession]:
         """
         Создает новую независимую LLM сессию
 
@@ -256,6 +611,7 @@ class LLMEngine:
             system_prompt: Системный промпт для сессии
             temperature: Температура для сессии (опционально)
             filter_thinking: Включить фильтрацию thinking-блоков (опционально)
+            max_tokens: Лимит длины ответа для сессии (опционально)
 
         Returns:
             Новая LLMSession или None если LLM недоступен
@@ -264,12 +620,18 @@ class LLMEngine:
             return None
 
         session_temperature = temperature if temperature is not None else self.temperature
-        session_filter_thinking = filter_thinking if filter_thinking is not None else self.filter_thinking
+        if filter_thinking is None:
+            filter_thinking = self.filter_thinking and self._emits_thinking
 
         return LLMSession(
             client=self.client,
             model=self.model,
             system_prompt=system_prompt,
             temperature=session_temperature,
-            filter_thinking=session_filter_thinking
+            filter_thinking=filter_thinking,
+            max_context_tokens=self.max_context_tokens,
+            keep_last_n=self.keep_last_n,
+            max_tokens=max_tokens if max_tokens is not None else self.max_tokens,
+            stop=self.stop_sequences,
+            top_p=self.top_p
         )
\ No newline at end of file
@@ -2,15 +2,22 @@
 Pause detection module for speech recording.
 """
 
-import numpy as np
+import math
+import time
 
-from utils.audio_utils import calculate_energy
+from utils.audio_utils import mean_square_energy
 from utils.config_keys import ConfigKeys, ConfigSections
 
 
 class PauseDetector:
     """Детектор пауз в речи на основе анализа энергии сигнала"""
 
+    # Коэффициент сглаживания экспоненциального среднего уровня шума
+    NOISE_EMA_ALPHA = 0.05
+
+    # Интервал между отладочными сообщениями (секунды)
+    DEBUG_PRINT_INTERVAL = 0.5
+
     def __init__(self, config, debug=False):
         self.config = config
         self.voice_config = config[ConfigSections.VOICE_DETECTION]
@@ -21,51 +28,57 @@ class PauseDetector:
         self.voice_energy_threshold = self.voice_config.get(ConfigKeys.VoiceDetection.VOICE_ENERGY_THRESHOLD, 0.01)
         self.min_recording_duration = self.voice_config.get(ConfigKeys.VoiceDetection.MIN_RECORDING_DURATION, 0.5)  # секунды
         self.pause_detection_enabled = self.voice_config.get(ConfigKeys.VoiceDetection.PAUSE_DETECTION_ENABLED, True)
+        self.sample_rate = config[ConfigSections.WAKE_WORD].get(ConfigKeys.WakeWord.SAMPLE_RATE, 16000)
+        # Порог тишины в сэмплах: пауза отсчитывается по времени аудио потока
+        self._pause_threshold_samples = int(self.pause_threshold * self.sample_rate)
 
         # Состояние
-        self.sample_rate = config[ConfigSections.WAKE_WORD][ConfigKeys.WakeWord.SAMPLE_RATE]  # используем sample_rate от wake_word
-        self.chunk_size = config[ConfigSections.WAKE_WORD][ConfigKeys.WakeWord.CHUNK_SIZE]
-        self.samples_per_second = self.sample_rate / self.chunk_size
-
-        # Счетчики
         self.reset()
 
     def reset(self):
         """Сбрасывает состояние детектора"""
-        self.silence_chunks = 0
-        self.total_chunks = 0
-        self.noise_level = None
-        self.calibration_samples = []
-
-    def calibrate_noise_level(self, audio_chunk):
-        """Калибрует уровень фонового шума"""
-        if len(self.calibration_samples) < 10:  # собираем первые 10 чанков для калибровки
-            energy = calculate_energy(audio_chunk)
-            self.calibration_samples.append(energy)
-
-            if len(self.calibration_samples) == 10:
-                self.noise_level = np.mean(self.calibration_samples) * 2.0  # немного выше среднего фона
-                if self.debug:
-                    print(f"🔊 Калибровка шума: {self.noise_level:.6f}")
+        self.silence_samples = 0  # сэмплов тишины подряд с последнего чанка с голосом
+        self._last_debug_ts = {}  # время последнего отладочного сообщения по видам
+        self.noise_level = None  # экспоненциальное среднее энергии фона
+
+    def _debug_due(self, kind, now):
+        """Проверяет, пора ли выводить очередное отладочное сообщение данного вида"""
+        if now - self._last_debug_ts.get(kind, 0.0) < self.DEBUG_PRINT_INTERVAL:
+            return False
+        self._last_debug_ts[kind] = now
+        return True
+
+    def update_noise_level(self, energy):
+        """Обновляет уровень фонового шума по энергии тихого чанка (O(1) по памяти)"""
+        alpha = self.NOISE_EMA_ALPHA
+        self.noise_level = (1.0 - alpha) * self.noise_level + alpha * energy
 
     def is_voice_detected(self, audio_chunk):
         """Определяет, есть ли голос в аудио чанке"""
         if not self.pause_detection_enabled:
             return True  # всегда считаем, что голос есть
 
-        energy = calculate_energy(audio_chunk)
+        # Сравниваем квадраты: energy > threshold <=> energy ** 2 > threshold ** 2,
+        # корень нужен только для обновления уровня шума
+        energy_sq = mean_square_energy(audio_chunk)
 
-        # Калибруем если нужно
+        # Первый чанк задает начальный уровень шума
         if self.noise_level is None:
-            self.calibrate_noise_level(audio_chunk)
+            self.noise_level = math.sqrt(energy_sq)
+            if __debug__ and self.debug:
+                print(f"🔊 Начальный уровень шума: {self.noise_level:.6f}")
             return True  # во время калибровки считаем что голос есть
 
-        # Используем адаптивный порог: максимум из настроенного порога и калиброванного уровня шума
-        threshold = max(self.voice_energy_threshold, self.noise_level)
-        is_voice = energy > threshold
+        # Используем адаптивный порог: максимум из настроенного порога и уровня шума (немного выше фона)
+        threshold = max(self.voice_energy_threshold, 2.0 * self.noise_level)
+        is_voice = energy_sq > threshold * threshold
+
+        # На тишине продолжаем подстраиваться под фон (вентилятор, смена усиления микрофона)
+        if not is_voice:
+            self.update_noise_level(math.sqrt(energy_sq))
 
-        if self.debug and self.total_chunks % 10 == 0:  # каждые 10 чанков
-            print(f"🔊 Энергия: {energy:.6f}, порог: {threshold:.6f}, голос: {is_voice}")
+        if __debug__ and self.debug and self._debug_due('energy', time.monotonic()):
+            print(f"🔊 Энергия: {math.sqrt(energy_sq):.6f}, порог: {threshold:.6f}, голос: {is_voice}")
 
         return is_voice
 
@@ -78,19 +91,12 @@ class PauseDetector:
         if recording_duration < self.min_recording_duration:
             return False
 
-        self.total_chunks += 1
-
-        # Проверяем наличие голоса
-        if self.is_voice_detected(audio_chunk):
-            self.silence_chunks = 0  # сброс счетчика тишины
-        else:
-            self.silence_chunks += 1
-
-        # Вычисляем время тишины
-        silence_duration = self.silence_chunks / self.samples_per_second
+        # Счетчик тишины без ветвления: чанк с голосом обнуляет его умножением на 0
+        is_voice = self.is_voice_detected(audio_chunk)
+        self.silence_samples = (self.silence_samples + len(audio_chunk)) * (not is_voice)
 
-        if self.debug and self.silence_chunks > 0 and self.silence_chunks % 5 == 0:
-            print(f"🤫 Тишина: {silence_duration:.1f}s из {self.pause_threshold}s")
+        if __debug__ and self.debug and self.silence_samples and self._debug_due('silence', time.monotonic()):
+            print(f"🤫 Тишина: {self.silence_samples / self.sample_rate:.1f}s из {self.pause_threshold}s")
 
         # Останавливаем запись при превышении порога тишины
-        return silence_duration >= self.pause_threshold
\ No newline at end of file
+        return self.silence_samples >= self._pause_threshold_samples
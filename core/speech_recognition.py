@@ -2,18 +2,108 @@
 Speech recognition module using FasterWhisper.
 """
 
+import functools
+import io
+import math
 import os
 import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
 
+import numpy as np
 import soundfile as sf
-import torch
 from faster_whisper import WhisperModel
+try:
+    from faster_whisper import BatchedInferencePipeline
+except ImportError:  # faster-whisper < 1.1 - батчинга нет, распознаем последовательно
+    BatchedInferencePipeline = None
+from scipy.signal import resample_poly
 
+from utils.audio_utils import int16_to_float32
 from utils.config_keys import ConfigKeys, ConfigSections
+from utils.device import best_device, supported_compute_types
 from utils.logger import get_logger
 
 
+def _physical_cores():
+    """Число физических ядер (без SMT); без psutil - число логических"""
+    try:
+        import psutil
+        return psutil.cpu_count(logical=False) or os.cpu_count() or 1
+    except ImportError:
+        return os.cpu_count() or 1
+
+
+def _whisper_cpu_threads():
+    """
+    Число потоков CTranslate2 для Whisper на CPU
+
+    По одному на физическое ядро: потоки SMT не ускоряют матричные операции, а лишь
+    конкурируют с TTS. Задается только для модели (cpu_threads), глобальные пулы
+    numpy/torch не затрагиваются; явно заданный OMP_NUM_THREADS имеет приоритет.
+    """
+    try:
+        return int(os.environ.get('OMP_NUM_THREADS', 0)) or _physical_cores()
+    except ValueError:
+        return _physical_cores()
+
+
+# Частота дискретизации, с которой работает Whisper
+WHISPER_SAMPLE_RATE = 16000
+
+# Ширина луча по режиму качества: быстрый жадный декодинг или точный beam search
+BEAM_SIZE_BY_MODE = {"fast": 1, "accurate": 5}
+
+# Температуры повторного декодирования, если жадный результат отбракован
+# (слишком высокая степень сжатия или низкая вероятность)
+FALLBACK_TEMPERATURES = [0.0, 0.2, 0.4, 0.6]
+
+# Предпочтительные типы вычислений по убыванию скорости (при сопоставимой точности)
+PREFERRED_COMPUTE_TYPES = {
+    "cuda": ("int8_float16", "float16", "int8"),
+    "cpu": ("int8", "int8_float32"),
+}
+
+
+# Потоковое распознавание: точка разреза окна ищется в последней секунде окна
+# как самый тихий фрейм длиной 20 мс (скорее всего - промежуток между словами)
+STREAM_CUT_SEARCH_SECONDS = 1.0
+STREAM_CUT_FRAME_SECONDS = 0.02
+
+
+# Защищает загрузку модели: два одновременных initialize() не должны грузить ее дважды
+_model_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1)
+def _load_whisper_model(model_size, device, compute_type, download_root=None, num_workers=1):
+    """
+    Загружает модель FasterWhisper один раз на процесс
+
+    Повторная инициализация (новый SpeechRecognizer, перезапуск ассистента внутри
+    процесса) получает уже загруженную модель. Сначала модель ищется только в
+    локальном кэше, чтобы не ждать сетевой проверки обновлений на Hugging Face.
+
+    Модель потокобезопасна: transcribe() можно вызывать из нескольких потоков,
+    CTranslate2 выполняет до num_workers запросов параллельно, остальные ждут
+    в очереди.
+    """
+    kwargs = dict(
+        device=device,
+        compute_type=compute_type,
+        num_workers=num_workers,
+        cpu_threads=_whisper_cpu_threads(),
+        download_root=download_root
+    )
+    try:
+        return WhisperModel(model_size, local_files_only=True, **kwargs)
+    except Exception:
+        # Модели еще нет в кэше - скачиваем
+        return WhisperModel(model_size, **kwargs)
+
+
 class SpeechRecognizer:
     """Распознаватель речи на основе FasterWhisper (упрощенная версия voice_recorder.py)"""
 
@@ -21,8 +111,24 @@ class SpeechRecognizer:
         self.config = config
         self.transcription_config = config[ConfigSections.TRANSCRIPTION]
         self.whisper_model = None
+        self.batched_model = None
+        self.batched_interactive = False
         self.logger = get_logger('speech_recognition')
 
+        # Параметры декодирования читаются из конфига один раз, а не на каждую реплику
+        self.language = self.transcription_config.get(ConfigKeys.Transcription.LANGUAGE, 'ru')
+        self.beam_size = self._beam_size()
+        self.vad_filter = self.transcription_config.get(ConfigKeys.Transcription.VAD_FILTER, True)
+        self.vad_parameters = self.transcription_config.get(
+            ConfigKeys.Transcription.VAD_PARAMETERS, {"min_silence_duration_ms": 300}
+        )
+        self.batch_size = self.transcription_config.get(ConfigKeys.Transcription.BATCH_SIZE, 16)
+        self.stream_window = self.transcription_config.get(ConfigKeys.Transcription.STREAM_WINDOW, 8.0)
+        self.save_audio_files = self.transcription_config.get('save_audio_files', False)
+
+        # Сохранение записей на диск не должно задерживать распознавание
+        self._save_executor = ThreadPoolExecutor(max_workers=1)
+
     def initialize(self):
         """Инициализация модели FasterWhisper"""
         try:
@@ -30,17 +136,29 @@ class SpeechRecognizer:
             device = self.transcription_config.get(ConfigKeys.Transcription.DEVICE, 'auto')
             compute_type = self.transcription_config.get(ConfigKeys.Transcription.COMPUTE_TYPE, 'auto')
 
-            # Автоопределение устройства если нужно
-            if device == 'auto' or compute_type == 'auto':
-                device, compute_type = self._detect_optimal_settings()
+            # Автоопределение устройства и типа вычислений если нужно
+            if device == 'auto':
+                device = self._detect_device()
+            if compute_type == 'auto':
+                compute_type = self._select_compute_type(device)
 
             self.logger.info(f"Загрузка FasterWhisper: {model_size}/{device}/{compute_type}")
 
-            self.whisper_model = WhisperModel(
-                model_size,
-                device=device,
-                compute_type=compute_type
-            )
+            download_root = self.transcription_config.get(ConfigKeys.Transcription.DOWNLOAD_ROOT)
+            num_workers = self.transcription_config.get(ConfigKeys.Transcription.NUM_WORKERS, 1)
+            with _model_lock:
+                self.whisper_model = _load_whisper_model(model_size, device, compute_type, download_root, num_workers)
+            if BatchedInferencePipeline is not None:
+                self.batched_model = BatchedInferencePipeline(model=self.whisper_model)
+                # На GPU пачка VAD-сегментов одной реплики декодируется за один вызов
+                # энкодера; на CPU выигрыша нет, поэтому по умолчанию только для CUDA
+                self.batched_interactive = self.transcription_config.get(
+                    ConfigKeys.Transcription.BATCHED_INTERACTIVE, device == 'cuda'
+                )
+
+            # Прогрев: первый вызов выделяет буферы и выбирает ядра CTranslate2
+            if self.transcription_config.get(ConfigKeys.Transcription.WARMUP, True):
+                self._warmup()
 
             self.logger.info("FasterWhisper готов к работе")
             return True
@@ -49,78 +167,309 @@ class SpeechRecognizer:
             self.logger.error(f"Ошибка инициализации FasterWhisper: {e}")
             return False
 
-    def _detect_optimal_settings(self):
-        """Простое автоопределение настроек устройства"""
+    def _detect_device(self):
+        """Простое автоопределение устройства (проверка CUDA кэшируется на процесс)"""
+        return best_device().type
+
+    def _select_compute_type(self, device):
+        """
+        Выбирает самый быстрый тип вычислений, поддерживаемый устройством
+
+        На GPU int8 веса с float16 вычислениями вдвое сокращают память и трафик весов
+        при той же точности. Если поддержку узнать не удалось, выбор остается за
+        CTranslate2 ("auto").
+        """
+        supported = supported_compute_types(device)
+        if not supported:
+            return "auto"
+        for compute_type in PREFERRED_COMPUTE_TYPES.get(device, ()):
+            if compute_type in supported:
+                return compute_type
+        return "auto"
+
+    def _warmup(self):
+        """Прогоняет секунду тишины через модель, чтобы первая реплика не ждала холодный старт"""
+        start_time = time.time()
+        try:
+            language = self.language
+            silence = np.zeros(WHISPER_SAMPLE_RATE, dtype=np.float32)
+
+            # Энкодер и декодер (CUDA контекст, ядра, пул памяти) - с теми же опциями, что и в работе
+            segments, _ = self.whisper_model.transcribe(
+                silence,
+                language=language,
+                beam_size=1,
+                condition_on_previous_text=False,
+                without_timestamps=True
+            )
+            for _ in segments:  # генератор: декодирование выполняется при итерации
+                pass
+
+            # VAD модель загружается при первом вызове с vad_filter - загружаем ее сейчас
+            if self.vad_filter:
+                segments, _ = self.whisper_model.transcribe(silence, language=language, vad_filter=True)
+                for _ in segments:
+                    pass
+
+            # Пакетный путь (по умолчанию на CUDA) декодирует пачками другой формы -
+            # прогреваем и его, без VAD: тишину VAD отбросил бы до энкодера
+            if self.batched_interactive:
+                segments, _ = self.batched_model.transcribe(
+                    silence,
+                    batch_size=self.batch_size,
+                    vad_filter=False,
+                    **self._decoding_options()
+                )
+                for _ in segments:
+                    pass
+
+            self.logger.info(f"FasterWhisper прогрет (время: {time.time() - start_time:.3f}s)")
+        except Exception as e:
+            self.logger.warning(f"Не удалось прогреть FasterWhisper: {e}")
+
+    def _beam_size(self):
+        """Ширина луча: явная настройка beam_size или значение по режиму beam_quality_mode"""
+        mode = self.transcription_config.get(ConfigKeys.Transcription.BEAM_QUALITY_MODE, 'fast')
+        return self.transcription_config.get(ConfigKeys.Transcription.BEAM_SIZE, BEAM_SIZE_BY_MODE.get(mode, 1))
+
+    def _decoding_options(self):
+        """
+        Опции декодирования, общие для последовательного и пакетного распознавания
+
+        Короткие реплики ассистента: жадный декодинг, без таймстемпов и без
+        связывания сегментов через предыдущий текст.
+        """
+        return dict(
+            language=self.language,
+            beam_size=self.beam_size,
+            best_of=1,
+            temperature=FALLBACK_TEMPERATURES,
+            compression_ratio_threshold=2.4,
+            condition_on_previous_text=False,
+            without_timestamps=True
+        )
+
+    @staticmethod
+    def _ensure_16k_mono(audio_data, sample_rate):
+        """Приводит аудио к непрерывному моно float32 16 кГц в памяти (без записи во временный файл)"""
+        audio = np.asarray(audio_data)
+        if audio.dtype == np.int16:
+            # Запись с микрофона в int16 - масштабируем в [-1, 1), как ожидает Whisper
+            audio = int16_to_float32(audio)
+        else:
+            audio = np.asarray(audio, dtype=np.float32)
+
+        # Запись с микрофона уже в нужном формате - используем как есть, без копий
+        if sample_rate == WHISPER_SAMPLE_RATE and audio.ndim == 1 and audio.flags.c_contiguous:
+            return audio
+
+        if audio.ndim > 1:
+            # Многоканальная запись (кадры x каналы) сводится в моно
+            audio = audio.mean(axis=1, dtype=np.float32)
+        if sample_rate != WHISPER_SAMPLE_RATE:
+            divisor = math.gcd(int(sample_rate), WHISPER_SAMPLE_RATE)
+            audio = resample_poly(
+                audio, WHISPER_SAMPLE_RATE // divisor, int(sample_rate) // divisor
+            ).astype(np.float32, copy=False)
+        return np.ascontiguousarray(audio)
+
+    def _save_audio(self, filename, audio_data, sample_rate):
+        """Сохраняет запись в WAV файл (выполняется в фоновом потоке)"""
         try:
-            # Проверяем доступность CUDA
-            if torch.cuda.is_available():
-                return "cuda", "float16"
-        except:
-            pass
-        return "cpu", "int8"
+            sf.write(filename, audio_data, sample_rate)
+        except Exception as e:
+            self.logger.warning(f"Не удалось сохранить запись {filename}: {e}")
 
     def transcribe_audio(self, audio_data, sample_rate):
         """Транскрибирует аудио в текст"""
+        return " ".join(self.transcribe_audio_stream(audio_data, sample_rate)).strip()
+
+    def _submit_save(self, audio_data, sample_rate):
+        """Сохраняет запись в рабочей директории если нужно, не блокируя распознавание"""
+        if self.save_audio_files:
+            # Уникальное имя даже для записей, завершенных в одну секунду
+            fd, filename = tempfile.mkstemp(prefix=f"recording_{time.strftime('%Y%m%d%H%M%S')}_", suffix='.wav', dir='.')
+            os.close(fd)
+            self._save_executor.submit(self._save_audio, filename, audio_data, sample_rate)
+
+    def start_stream(self, sample_rate):
+        """
+        Начинает потоковое распознавание записи, которая еще продолжается
+
+        Returns:
+            TranscriptionStream: принимает аудио через feed(), текст - через finalize()
+        """
+        return TranscriptionStream(self, sample_rate, self.stream_window)
+
+    def transcribe_audio_stream(self, audio_data, sample_rate) -> Iterator[str]:
+        """Транскрибирует аудио, выдавая текст сегментов по мере их декодирования"""
         if not self.whisper_model:
-            return ""
+            return
+        self._submit_save(audio_data, sample_rate)
+        yield from self._transcribe_segments(audio_data, sample_rate)
 
+    def _transcribe_segments(self, audio_data, sample_rate) -> Iterator[str]:
+        """Декодирует аудио и выдает текст сегментов (без сохранения записи)"""
         start_time = time.time()
-        temp_file = None
 
         try:
-            # Получаем настройки из конфига
-            save_audio_files = self.transcription_config.get('save_audio_files', False)
-            auto_delete_audio = self.transcription_config.get('auto_delete_audio', True)
-
-            # Создаем временный файл
-            if save_audio_files:
-                # Если нужно сохранять файлы, создаем в рабочей директории
-                temp_filename = f"temp_recording_{int(time.time())}.wav"
-                sf.write(temp_filename, audio_data, sample_rate)
-            else:
-                # Используем системный временный каталог
-                temp_file = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-                temp_filename = temp_file.name
-                temp_file.close()  # Закрываем файл, чтобы soundfile мог записать в него
-                sf.write(temp_filename, audio_data, sample_rate)
+            # Передаем массив напрямую в модель
+            audio = self._ensure_16k_mono(audio_data, sample_rate)
 
             # Транскрибируем
-            language = self.transcription_config.get(ConfigKeys.Transcription.LANGUAGE, 'ru')
-            beam_size = self.transcription_config.get(ConfigKeys.Transcription.BEAM_SIZE, 5)
+            vad_filter = self.vad_filter
+            vad_parameters = self.vad_parameters
 
-            segments, info = self.whisper_model.transcribe(
-                temp_filename,
-                language=language,
-                beam_size=beam_size,
-                word_timestamps=False
-            )
+            if self.batched_interactive:
+                # VAD-сегменты реплики декодируются пачкой (без VAD пачек нет)
+                segments, info = self.batched_model.transcribe(
+                    audio,
+                    batch_size=self.batch_size,
+                    vad_filter=True,
+                    vad_parameters=vad_parameters,
+                    **self._decoding_options()
+                )
+            else:
+                # VAD пропускает тишину
+                segments, info = self.whisper_model.transcribe(
+                    audio,
+                    word_timestamps=False,
+                    vad_filter=vad_filter,
+                    vad_parameters=vad_parameters if vad_filter else None,
+                    **self._decoding_options()
+                )
 
-            # Собираем текст
-            text_segments = []
+            # Выдаем сегменты по мере декодирования и собираем текст для лога
+            text_buffer = io.StringIO()
             for segment in segments:
-                text_segments.append(segment.text)
+                text_buffer.write(segment.text)
+                text_buffer.write(" ")
+                yield segment.text
 
-            text = " ".join(text_segments).strip()
+            text = text_buffer.getvalue().strip()
             transcription_time = time.time() - start_time
 
-            # Удаляем временный файл согласно настройкам
-            if auto_delete_audio and not save_audio_files:
-                try:
-                    os.remove(temp_filename)
-                except Exception as cleanup_error:
-                    self.logger.warning(f"Не удалось удалить временный файл {temp_filename}: {cleanup_error}")
-
             if text.strip():
                 self.logger.info(f"Распознано: {text} (время: {transcription_time:.3f}s)")
 
-            return text
-
         except Exception as e:
             self.logger.error(f"Ошибка транскрипции: {e}")
-            # Пытаемся очистить временный файл в случае ошибки
-            if temp_file and os.path.exists(temp_file.name):
-                try:
-                    os.remove(temp_file.name)
-                except:
-                    pass
-            return ""
\ No newline at end of file
+
+    def transcribe_batch(self, audio_list, sample_rate):
+        """
+        Транскрибирует несколько записей (пакетная обработка, например подготовленных файлов)
+
+        BatchedInferencePipeline декодирует VAD-сегменты каждой записи пачками по
+        batch_size за один вызов энкодера. Интерактивные реплики идут через
+        transcribe_audio_stream, который использует пачки только при batched_interactive.
+
+        Returns:
+            Список распознанных текстов в порядке входных записей
+        """
+        if not self.whisper_model:
+            return []
+
+        if self.batched_model is None:
+            return [self.transcribe_audio(audio_data, sample_rate) for audio_data in audio_list]
+
+        batch_size = self.batch_size
+        decoding_options = self._decoding_options()
+
+        texts = []
+        for audio_data in audio_list:
+            try:
+                segments, _ = self.batched_model.transcribe(
+                    self._ensure_16k_mono(audio_data, sample_rate),
+                    batch_size=batch_size,
+                    **decoding_options
+                )
+                texts.append(" ".join(segment.text for segment in segments).strip())
+            except Exception as e:
+                self.logger.error(f"Ошибка пакетной транскрипции: {e}")
+                texts.append("")
+        return texts
+
+
+class TranscriptionStream:
+    """
+    Распознавание во время записи
+
+    Whisper декодирует законченные фрагменты, поэтому запись режется на окна по
+    stream_window секунд (в самом тихом месте конца окна), и каждое окно
+    распознается в фоне, пока пользователь продолжает говорить. После остановки
+    записи остается распознать только последний, неполный фрагмент. Короткие
+    реплики (короче окна) распознаются целиком, как и раньше.
+    """
+
+    def __init__(self, recognizer, sample_rate, window_seconds):
+        self.recognizer = recognizer
+        self.sample_rate = sample_rate
+        self.window = int(window_seconds * sample_rate) if window_seconds else 0
+        self._chunks = []  # вся запись - только если ее нужно сохранить на диск
+        self._pending = []  # аудио, еще не отправленное на распознавание
+        self._pending_len = 0
+        self._futures = []
+        self._executor = ThreadPoolExecutor(max_workers=1) if self.window else None
+
+    def feed(self, audio_chunk):
+        """Добавляет блок записи (int16 или float32); при накоплении окна отправляет его на распознавание"""
+        if audio_chunk.dtype == np.int16:
+            chunk = int16_to_float32(audio_chunk)
+        else:
+            chunk = np.array(audio_chunk, dtype=np.float32)
+        if self.recognizer.save_audio_files:
+            self._chunks.append(chunk)
+        self._pending.append(chunk)
+        self._pending_len += len(chunk)
+
+        if self.window and self._pending_len >= self.window:
+            audio = np.concatenate(self._pending)
+            cut = self._find_cut(audio)
+            self._pending = [audio[cut:]]
+            self._pending_len = len(audio) - cut
+            self._futures.append(self._executor.submit(
+                lambda piece: list(self.recognizer._transcribe_segments(piece, self.sample_rate)),
+                audio[:cut]
+            ))
+
+    def has_pending_decoding(self, min_tail_seconds) -> bool:
+        """
+        Останется ли заметная работа декодеру после остановки записи
+
+        True, если во время записи уже отправлялись окна (их результаты и хвост
+        выдаются последовательно) или если хвост длиннее min_tail_seconds.
+        """
+        return bool(self._futures) or self._pending_len >= min_tail_seconds * self.sample_rate
+
+    def _find_cut(self, audio):
+        """Возвращает индекс разреза: середина самого тихого фрейма в конце окна"""
+        frame = max(1, int(STREAM_CUT_FRAME_SECONDS * self.sample_rate))
+        search = min(len(audio), int(STREAM_CUT_SEARCH_SECONDS * self.sample_rate))
+        frames = search // frame
+        if frames == 0:
+            return len(audio)
+        start = len(audio) - frames * frame
+        tail = audio[start:].reshape(frames, frame)
+        quietest = int(np.argmin(np.einsum('ij,ij->i', tail, tail)))
+        return start + quietest * frame + frame // 2
+
+    def finalize(self) -> Iterator[str]:
+        """
+        Завершает запись и выдает текст сегментов по порядку
+
+        Уже распознанные окна выдаются сразу, последний фрагмент - по мере декодирования.
+        """
+        if not self.recognizer.whisper_model:
+            return
+
+        if self._chunks:
+            self.recognizer._submit_save(np.concatenate(self._chunks), self.sample_rate)
+
+        try:
+            for future in self._futures:
+                yield from future.result()
+            if self._pending_len:
+                yield from self.recognizer._transcribe_segments(np.concatenate(self._pending), self.sample_rate)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
@@ -2,17 +2,76 @@
 Text-to-speech module using Silero TTS.
 """
 
+import queue
+import re
+import threading
 import time
 import os
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional, Union
 
+import numpy as np
 import sounddevice as sd
+import soundfile as sf
 import torch
-import torchaudio
 
 from utils.config_keys import ConfigKeys, ConfigSections
+from utils.device import best_device
+from utils.audio_utils import float32_to_int16
 from utils.logger import get_logger
+from utils.text_filters import SENTENCE_END_RE
+
+try:
+    from razdel import sentenize
+except ImportError:  # razdel не установлен - делим по знакам конца предложения
+    sentenize = None
+
+
+# Пакет модели Silero ru_v3 (тот же файл, который скачивает torch.hub)
+SILERO_MODEL_URL = 'https://models.silero.ai/models/tts/ru/v3_1_ru.pt'
+
+# Размер блока потока воспроизведения (сэмплов)
+PLAYBACK_BLOCKSIZE = 2048
+
+# Кэш синтеза повторяющихся коротких фраз ("Слушаю", "Готово")
+TTS_CACHE_SIZE = 64
+TTS_CACHE_MAX_TEXT = 120  # более длинные предложения не кэшируются
+
+# Длинное первое предложение при воспроизведении делится по первой запятой (не раньше
+# FIRST_FRAGMENT_MIN_CHARS символов): звук начинается после синтеза короткого фрагмента
+FIRST_FRAGMENT_MAX_CHARS = 80
+FIRST_FRAGMENT_MIN_CHARS = 20
+_CLAUSE_END_RE = re.compile(r'[,;:—]\s+')
+
+
+def split_sentences(text):
+    """
+    Делит текст на предложения для поочередного синтеза
+
+    razdel учитывает русские сокращения ("т.е.", "г.", инициалы), поэтому
+    предложение не обрывается посередине; без него используется SENTENCE_END_RE.
+    """
+    text = text.strip()
+    if sentenize is not None:
+        return [sentence.text for sentence in sentenize(text) if sentence.text.strip()]
+    return [sentence for sentence in SENTENCE_END_RE.split(text) if sentence]
+
+
+def split_for_playback(text):
+    """
+    Делит текст на фрагменты для синтеза с воспроизведением
+
+    То же, что split_sentences, но длинное первое предложение делится по первой
+    подходящей запятой: пока играет первый фрагмент, синтезируется остаток.
+    """
+    sentences = split_sentences(text)
+    if sentences and len(sentences[0]) > FIRST_FRAGMENT_MAX_CHARS:
+        match = _CLAUSE_END_RE.search(sentences[0], FIRST_FRAGMENT_MIN_CHARS)
+        if match:
+            first = sentences[0]
+            sentences[0:1] = [first[:match.start() + 1], first[match.end():]]
+    return sentences
 
 
 class TextToSpeech:
@@ -28,6 +87,14 @@ class TextToSpeech:
         self.playback_device = self.assistant_config.get('playback_device', None)
         self.offline_mode = False  # Флаг для офлайн режима
         self.accentizer = None
+        self.half_precision = False  # FP16 (autocast) синтез, включается на CUDA
+        self._apply_tts = None  # функция синтеза (при включенной опции - скомпилированная)
+        self._pcm_cache = OrderedDict()  # (текст, голос, частота) -> int16 PCM
+        self._pcm_cache_lock = threading.Lock()
+        # Поток вывода открывается при первом воспроизведении и переиспользуется:
+        # открытие устройства PortAudio стоит десятки-сотни миллисекунд на каждую фразу
+        self._output_stream = None
+        self._playback_lock = threading.Lock()
         self.logger = get_logger('tts')
 
     def initialize(self):
@@ -40,15 +107,25 @@ class TextToSpeech:
 
             # Пытаемся загрузить модель с таймаутом
             try:
-                device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-                self.model, example_text = torch.hub.load(
-                    repo_or_dir='snakers4/silero-models',
-                    model='silero_tts',
-                    language='ru',
-                    speaker='ru_v3',
-                    force_reload=False  # Используем кэш если есть
-                )
+                device = best_device()
+                try:
+                    self.model = self._load_local_model()
+                except Exception as local_error:
+                    self.logger.warning(f"Локальный пакет Silero недоступен ({local_error}), загрузка через torch.hub")
+                    self.model, example_text = torch.hub.load(
+                        repo_or_dir='snakers4/silero-models',
+                        model='silero_tts',
+                        language='ru',
+                        speaker='ru_v3',
+                        force_reload=False  # Используем кэш если есть
+                    )
+                if device.type == 'cpu' and self.assistant_config.get(ConfigKeys.TTS.QUANTIZE_TTS, False):
+                    self._quantize_model()
                 self.model.to(device)
+                self.half_precision = (
+                    device.type == 'cuda' and self.assistant_config.get(ConfigKeys.TTS.TTS_HALF_PRECISION, True)
+                )
+                self._apply_tts = self._build_tts_fn()
                 model_loaded = True
                 self.logger.info("Модель Silero успешно загружена")
 
@@ -79,6 +156,8 @@ class TextToSpeech:
                 self._check_audio_device()
 
             if model_loaded:
+                if self.assistant_config.get(ConfigKeys.TTS.TTS_WARMUP, True):
+                    self._warmup()
                 self.logger.info(f"Silero TTS готов (динамик: {self.speaker})")
             else:
                 self.logger.warning("TTS работает в ограниченном режиме")
@@ -89,6 +168,132 @@ class TextToSpeech:
             self.logger.critical(f"Критическая ошибка инициализации TTS: {e}")
             return False
 
+    def _load_local_model(self):
+        """
+        Загружает Silero напрямую из файла пакета, минуя torch.hub
+
+        torch.hub при каждом запуске обращается к GitHub и выполняет hubconf;
+        файл пакета скачивается один раз и дальше читается с диска.
+        """
+        model_path = self.assistant_config.get(ConfigKeys.TTS.TTS_MODEL_PATH)
+        model_path = Path(model_path) if model_path else Path(torch.hub.get_dir()) / 'silero' / 'v3_1_ru.pt'
+
+        if not model_path.is_file():
+            model_path.parent.mkdir(parents=True, exist_ok=True)
+            self.logger.info(f"Скачивание модели Silero в {model_path}")
+            torch.hub.download_url_to_file(SILERO_MODEL_URL, str(model_path))
+
+        return torch.package.PackageImporter(str(model_path)).load_pickle("tts_models", "model")
+
+    def _quantize_model(self):
+        """Динамическая int8 квантизация Linear/LSTM слоев модели для CPU"""
+        try:
+            # Пакет Silero хранит сеть в атрибуте model, обертка отвечает за обработку текста
+            network = getattr(self.model, 'model', self.model)
+            quantized = torch.quantization.quantize_dynamic(
+                network, {torch.nn.Linear, torch.nn.LSTM}, dtype=torch.qint8
+            )
+            if network is self.model:
+                self.model = quantized
+            else:
+                self.model.model = quantized
+            self.logger.info("Модель Silero квантизована (int8)")
+        except Exception as e:
+            self.logger.warning(f"Квантизация Silero недоступна, используется FP32: {e}")
+
+    def _build_tts_fn(self, allow_compile=True):
+        """
+        Возвращает функцию синтеза с зафиксированной частотой дискретизации
+
+        При включенной опции tts_compile функция компилируется torch.compile;
+        без поддержки (старый PyTorch) используется обычный вызов модели.
+        """
+        model = self.model
+        sample_rate = self.sample_rate
+
+        def apply_tts(text, speaker):
+            return model.apply_tts(text=text, speaker=speaker, sample_rate=sample_rate)
+
+        if allow_compile and self.assistant_config.get(ConfigKeys.TTS.TTS_COMPILE, False) and hasattr(torch, 'compile'):
+            try:
+                return torch.compile(apply_tts, mode='reduce-overhead', dynamic=True)
+            except Exception as compile_error:
+                self.logger.warning(f"torch.compile недоступен для Silero: {compile_error}")
+        return apply_tts
+
+    def _warmup(self):
+        """Прогревает синтез, чтобы первая реплика не ждала оптимизацию графа и выделение памяти"""
+        start_time = time.time()
+        try:
+            # TorchScript оптимизирует граф после первых запусков (profiling executor)
+            for _ in range(2):
+                self._synthesize("Привет.", self.speaker)
+            self.logger.info(f"Silero TTS прогрет (время: {time.time() - start_time:.3f}s)")
+        except Exception as e:
+            self.logger.warning(f"Не удалось прогреть Silero TTS: {e}")
+            # torch.compile компилирует при первом вызове - при ошибке возвращаемся к обычному синтезу
+            self._apply_tts = self._build_tts_fn(allow_compile=False)
+
+    def _synthesize(self, text, speaker):
+        """Расставляет ударения и синтезирует аудио без отслеживания градиентов"""
+        # Обрабатываем текст акцентизатором если нужно
+        processed_text = text
+        if self.use_accentizer and self.accentizer:
+            processed_text = self.accentizer.process_all(text)
+
+        with torch.inference_mode():
+            if self.half_precision:
+                try:
+                    with torch.autocast(device_type='cuda', dtype=torch.float16):
+                        audio = self._apply_tts(processed_text, speaker)
+                    return audio.float()
+                except Exception as half_error:
+                    self.logger.warning(f"FP16 синтез недоступен, используется FP32: {half_error}")
+                    self.half_precision = False
+
+            return self._apply_tts(processed_text, speaker)
+
+    @staticmethod
+    def _to_numpy(audio):
+        """
+        Переносит синтезированное аудио в numpy float32
+
+        С GPU копирование идет в page-locked (pinned) буфер асинхронно: такая
+        передача быстрее обычной .cpu(), ожидается только текущий CUDA поток.
+        Буфер берется из кэширующего аллокатора PyTorch и принадлежит
+        возвращаемому массиву, поэтому следующий синтез его не перезапишет.
+        """
+        audio = audio.detach()
+        if audio.is_cuda:
+            host = torch.empty(audio.shape, dtype=audio.dtype, pin_memory=True)
+            host.copy_(audio, non_blocking=True)
+            torch.cuda.current_stream(audio.device).synchronize()
+            audio = host
+        return audio.numpy().astype(np.float32, copy=False)
+
+    def _synthesize_pcm(self, text, speaker):
+        """
+        Синтезирует предложение в int16 PCM, повторные короткие фразы берутся из кэша
+
+        Воспроизводится int16 PCM: вдвое меньше данных и без конвертации в драйвере.
+        """
+        key = (text, speaker, self.sample_rate)
+        with self._pcm_cache_lock:
+            pcm = self._pcm_cache.get(key)
+            if pcm is not None:
+                self._pcm_cache.move_to_end(key)
+                return pcm
+
+        pcm = float32_to_int16(self._to_numpy(self._synthesize(text, speaker)))
+
+        if len(text) <= TTS_CACHE_MAX_TEXT:
+            pcm.setflags(write=False)  # массив разделяется между воспроизведениями
+            with self._pcm_cache_lock:
+                self._pcm_cache[key] = pcm
+                while len(self._pcm_cache) > TTS_CACHE_SIZE:
+                    self._pcm_cache.popitem(last=False)
+        return pcm
+
     def synthesize_and_play(self, text, voice_override: Optional[str] = None, save_path: Optional[str] = None):
         """
         Синтезирует и воспроизводит речь
@@ -106,49 +311,92 @@ class TextToSpeech:
             return False
 
         start_time = time.time()
-        try:
-            # Определяем голос для использования
-            speaker_to_use = voice_override if voice_override else self.speaker
 
-            # Обрабатываем текст акцентизатором если нужно
-            processed_text = text
-            if self.use_accentizer and self.accentizer:
-                processed_text = self.accentizer.process_all(text)
+        # Определяем голос для использования
+        speaker_to_use = voice_override if voice_override else self.speaker
 
-            # Генерируем аудио
-            audio = self.model.apply_tts(
-                text=processed_text,
-                speaker=speaker_to_use,
-                sample_rate=self.sample_rate
-            )
+        # Длинный текст синтезируется по предложениям: следующее предложение
+        # синтезируется, пока воспроизводится текущее
+        sentences = split_for_playback(text)
+        audio_queue = queue.Queue(maxsize=2)
+        stop = threading.Event()
+        synthesized = []
+        synthesis_failed = threading.Event()
 
-            audio_np = audio.detach().cpu().numpy()
-            synthesis_time = time.time() - start_time
-            self.logger.info(f"Синтезируем ({speaker_to_use}): {text} (время: {synthesis_time:.3f}s)")
-
-            # Сохраняем в файл если указан путь
-            if save_path:
-                self._save_audio_file(audio, save_path)
-                self.logger.info(f"Аудио сохранено: {save_path}")
-
-            # Воспроизводим только если не в офлайн режиме
-            if not self.offline_mode:
-                try:
-                    device_id = self.playback_device if self.playback_device is not None else sd.default.device[1]
-                    sd.play(audio_np, self.sample_rate, device=device_id)
-                    sd.wait()  # Ждем окончания воспроизведения
-                except Exception as audio_error:
-                    self.logger.error(f"Ошибка воспроизведения аудио: {audio_error}")
-                    return False
-            else:
-                self.logger.info("Офлайн режим: воспроизведение пропущено")
+        def produce():
+            try:
+                for sentence in sentences:
+                    if stop.is_set():
+                        break
+                    pcm = self._synthesize_pcm(sentence, speaker_to_use)
+                    synthesized.append(pcm)
+                    audio_queue.put(pcm)
+            except Exception as e:
+                self.logger.error("Ошибка синтеза речи: %s", e)
+                synthesis_failed.set()
+            finally:
+                audio_queue.put(None)  # конец потока
+
+        threading.Thread(target=produce, daemon=True).start()
 
-            return True
+        try:
+            with self._playback_lock:
+                stream = self._get_output_stream()
+                first_chunk = True
+                while True:
+                    pcm = audio_queue.get()
+                    if pcm is None:
+                        break
+                    if first_chunk:
+                        synthesis_time = time.time() - start_time
+                        self.logger.info("Синтезируем (%s): %s (время: %.3fs)", speaker_to_use, text, synthesis_time)
+                        first_chunk = False
+                    stream.write(pcm.reshape(-1, 1))  # блокируется, пока звук не уйдет в буфер
+                # Поток остается открытым, поэтому дожидаемся, пока хвост буфера
+                # доиграет: иначе микрофон услышит конец собственной фразы
+                if not first_chunk:
+                    time.sleep(stream.latency)
+        except Exception as audio_error:
+            self.logger.error("Ошибка воспроизведения аудио: %s", audio_error)
+            self.close()  # при следующем воспроизведении устройство откроется заново
+            # Останавливаем синтез и дожидаемся завершения потока
+            stop.set()
+            while audio_queue.get() is not None:
+                pass
+            return False
 
-        except Exception as e:
-            self.logger.error(f"Ошибка синтеза речи: {e}")
+        if synthesis_failed.is_set() or not synthesized:
             return False
 
+        # Сохраняем в файл если указан путь
+        if save_path:
+            try:
+                self._save_audio_file(np.concatenate(synthesized), save_path)
+                self.logger.info("Аудио сохранено: %s", save_path)
+            except Exception:
+                return False
+
+        return True
+
+    def _get_output_stream(self):
+        """Возвращает открытый поток вывода, открывая его при первом обращении"""
+        if self._output_stream is None:
+            device_id = self.playback_device if self.playback_device is not None else sd.default.device[1]
+            stream = sd.OutputStream(samplerate=self.sample_rate, channels=1, dtype='int16',
+                                     device=device_id, blocksize=PLAYBACK_BLOCKSIZE)
+            stream.start()
+            self._output_stream = stream
+        return self._output_stream
+
+    def close(self):
+        """Закрывает поток вывода (освобождает аудио устройство)"""
+        stream, self._output_stream = self._output_stream, None
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception as e:
+                self.logger.warning("Не удалось закрыть поток вывода: %s", e)
+
     def synthesize_only(self, text, voice_override: Optional[str] = None, save_path: Optional[str] = None):
         """
         Синтезирует речь без воспроизведения (для режима --no-audio)
@@ -169,31 +417,24 @@ class TextToSpeech:
             # Определяем голос для использования
             speaker_to_use = voice_override if voice_override else self.speaker
 
-            # Обрабатываем текст акцентизатором если нужно
-            processed_text = text
-            if self.use_accentizer and self.accentizer:
-                processed_text = self.accentizer.process_all(text)
-
-            # Генерируем аудио
-            audio = self.model.apply_tts(
-                text=processed_text,
-                speaker=speaker_to_use,
-                sample_rate=self.sample_rate
-            )
+            # Генерируем аудио по предложениям (int16, без длинного тензора на весь текст)
+            audio = np.concatenate([
+                self._synthesize_pcm(sentence, speaker_to_use) for sentence in split_sentences(text)
+            ])
 
             synthesis_time = time.time() - start_time
-            print(f"🔄 Синтез ({speaker_to_use}): {text} (время: {synthesis_time:.3f}s)")
+            self.logger.info("Синтез (%s): %s (время: %.3fs)", speaker_to_use, text, synthesis_time)
 
             # Сохраняем в файл
             if save_path:
                 self._save_audio_file(audio, save_path)
-                self.logger.info(f"Аудио сохранено: {save_path}")
+                self.logger.info("Аудио сохранено: %s", save_path)
                 return save_path
 
             return None
 
         except Exception as e:
-            self.logger.error(f"Ошибка синтеза речи: {e}")
+            self.logger.error("Ошибка синтеза речи: %s", e)
             return None
 
     def _check_audio_device(self):
@@ -203,33 +444,38 @@ class TextToSpeech:
                 # Проверяем указанное устройство
                 devices = sd.query_devices()
                 if self.playback_device >= len(devices):
-                    print(f"⚠️ Устройство {self.playback_device} не найдено, используется по умолчанию")
+                    self.logger.warning("Устройство %s не найдено, используется по умолчанию", self.playback_device)
                     self.playback_device = None
                 else:
                     device_info = devices[self.playback_device]
-                    print(f"🔊 Аудио устройство: {device_info['name']}")
+                    self.logger.info("Аудио устройство: %s", device_info['name'])
             else:
                 # Используем устройство по умолчанию
                 default_device = sd.default.device[1]
                 device_info = sd.query_devices(default_device)
-                print(f"🔊 Аудио устройство по умолчанию: {device_info['name']}")
+                self.logger.info("Аудио устройство по умолчанию: %s", device_info['name'])
 
         except Exception as e:
-            print(f"⚠️ Ошибка проверки аудио устройств: {e}")
+            self.logger.warning("Ошибка проверки аудио устройств: %s", e)
             self.playback_device = None
 
-    def _save_audio_file(self, audio_tensor, file_path: str):
-        """Сохраняет аудио тензор в файл"""
+    def _save_audio_file(self, audio, file_path: str):
+        """Сохраняет аудио (тензор или numpy массив) в WAV файл 16-bit PCM"""
         try:
             # Создаем директорию если не существует
             Path(file_path).parent.mkdir(parents=True, exist_ok=True)
 
-            # Преобразуем в правильный формат для сохранения
-            audio_to_save = audio_tensor.unsqueeze(0) if audio_tensor.dim() == 1 else audio_tensor
+            # Преобразуем в моно int16 для сохранения
+            if isinstance(audio, torch.Tensor):
+                audio = self._to_numpy(audio)
+            if audio.ndim == 2:
+                audio = audio[0]
+            pcm = audio if audio.dtype == np.int16 else float32_to_int16(audio)
 
-            # Сохраняем в WAV формате
-            torchaudio.save(file_path, audio_to_save, self.sample_rate)
+            # Сохраняем в WAV формате одной записью через буфер libsndfile
+            with sf.SoundFile(file_path, mode='w', samplerate=self.sample_rate, channels=1, subtype='PCM_16') as wav:
+                wav.write(pcm)
 
         except Exception as e:
-            print(f"❌ Ошибка сохранения аудио файла {file_path}: {e}")
-            raise
\ No newline at end of file
+            self.logger.error("Ошибка сохранения аудио файла %s: %s", file_path, e)
+            raise
@@ -4,15 +4,32 @@ Wake word detection module using Vosk.
 
 import json
 import os
+import re
 import time
-from collections import deque
 
 import numpy as np
 import vosk
 
-from utils.audio_utils import convert_float32_to_int16
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick не установлен - проверяем ключевые слова по очереди
+    ahocorasick = None
+
+from utils.audio_utils import float32_to_int16, ingest_pcm_chunk, write_ring_buffer
 from utils.config_keys import ConfigKeys, ConfigSections
 
+# Загруженные модели и распознаватели Vosk на процесс: повторная инициализация
+# детектора не перечитывает модель с диска и не строит граф декодера заново
+_MODEL_CACHE = {}
+_RECOGNIZER_CACHE = {}
+
+# Поле text (partial для промежуточного результата) в результате Vosk: формат
+# фиксирован, поэтому пустые результаты отсекаются без разбора JSON
+_RESULT_TEXT_RE = re.compile(r'"(?:text|partial)"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+# Слово грамматики Vosk для любой речи вне списка ключевых слов
+UNKNOWN_WORD = "[unk]"
+
 
 class WakeWordDetector:
     """Детектор ключевых слов на основе Vosk"""
@@ -23,14 +40,35 @@ class WakeWordDetector:
         self.model = None
         self.recognizer = None
         self.keywords = self.wake_config[ConfigKeys.WakeWord.KEYWORDS]
+        self._keywords_lower = tuple(keyword.lower() for keyword in self.keywords)
+        self._keyword_automaton = self._build_keyword_automaton(self._keywords_lower)
         self.debug = debug  # Для отладочного вывода
 
         # Кольцевой буфер для pre-trigger аудио
         self.pre_trigger_duration = self.wake_config.get(ConfigKeys.WakeWord.PRE_TRIGGER_DURATION, 3.0)
         self.sample_rate = self.wake_config[ConfigKeys.WakeWord.SAMPLE_RATE]
         self.chunk_size = self.wake_config[ConfigKeys.WakeWord.CHUNK_SIZE]
+        # Срабатывать по промежуточному результату, не дожидаясь конца фразы
+        self.detect_on_partial = self.wake_config.get(ConfigKeys.WakeWord.DETECT_ON_PARTIAL, True)
+        # Размер блока, которым аудио передается в detect_wake_word
+        self.decode_batch_size = self.wake_config.get(ConfigKeys.WakeWord.DECODE_BATCH_SIZE, self.chunk_size)
         buffer_size = int(self.sample_rate * self.pre_trigger_duration)
-        self.audio_buffer = deque(maxlen=buffer_size)
+        # Заранее выделенный массив с индексом записи: колбэк только копирует срез,
+        # без упаковки каждого сэмпла в Python float. Хранится int16 PCM - в том же
+        # формате, что приходит с микрофона и уходит в Vosk
+        self.audio_buffer = np.zeros(buffer_size, dtype=np.int16)
+        self._write_pos = 0
+        self._filled = 0
+        # Порог энергии: тишина не передается в декодер Kaldi. После громкого чанка
+        # декодер еще hangover секунд получает аудио - ему нужна тишина после слова,
+        # чтобы завершить фразу
+        self.energy_gate = self.wake_config.get(ConfigKeys.WakeWord.ENERGY_GATE, 0.005)
+        hangover = self.wake_config.get(ConfigKeys.WakeWord.ENERGY_GATE_HANGOVER, 1.0)
+        self._hangover_chunks = max(1, int(hangover * self.sample_rate / self.decode_batch_size))
+        self._hangover_left = 0
+
+        # Переиспользуемый int16 буфер для конвертации float32 блоков
+        self._pcm_buffer = np.empty(self.decode_batch_size, dtype=np.int16)
 
     def initialize(self):
         """Инициализация модели Vosk"""
@@ -42,13 +80,30 @@ class WakeWordDetector:
             return False
 
         try:
-            print(f"🔍 Загрузка модели Vosk: {model_path}")
-            self.model = vosk.Model(model_path)
-
-            # Создаем распознаватель с ключевыми словами в JSON формате
-            keywords_json = json.dumps(self.keywords, ensure_ascii=False)
+            # Создаем распознаватель с ключевыми словами в JSON формате. В замкнутой
+            # грамматике промежуточная гипотеза притягивается к ключевому слову почти
+            # на любой речи, поэтому для срабатывания по ней добавляется [unk]
+            grammar = list(self.keywords)
+            if self.detect_on_partial:
+                grammar.append(UNKNOWN_WORD)
+            keywords_json = json.dumps(grammar, ensure_ascii=False)
             sample_rate = self.wake_config[ConfigKeys.WakeWord.SAMPLE_RATE]
-            self.recognizer = vosk.KaldiRecognizer(self.model, sample_rate, keywords_json)
+            grammar_only = self.wake_config.get(ConfigKeys.WakeWord.GRAMMAR_ONLY, True)
+            cache_key = (model_path, sample_rate, keywords_json, grammar_only)
+
+            self.recognizer = _RECOGNIZER_CACHE.get(cache_key)
+            if self.recognizer is not None:
+                self.model = _MODEL_CACHE[model_path]
+                self.recognizer.Reset()
+                print(f"♻️ Используем загруженную модель Vosk: {model_path}")
+            else:
+                self.model = _MODEL_CACHE.get(model_path)
+                if self.model is None:
+                    print(f"🔍 Загрузка модели Vosk: {model_path}")
+                    self.model = vosk.Model(model_path)
+                    _MODEL_CACHE[model_path] = self.model
+                self.recognizer = self._create_recognizer(sample_rate, keywords_json, grammar_only)
+                _RECOGNIZER_CACHE[cache_key] = self.recognizer
 
             print(f"✅ Vosk готов к работе с ключевыми словами: {self.keywords}")
             return True
@@ -57,26 +112,127 @@ class WakeWordDetector:
             print(f"❌ Ошибка инициализации Vosk: {e}")
             return False
 
+    @staticmethod
+    def _build_keyword_automaton(keywords):
+        """Строит автомат Ахо-Корасик: все ключевые слова ищутся за один проход по тексту"""
+        if ahocorasick is None or not keywords:
+            return None
+        automaton = ahocorasick.Automaton()
+        for keyword in keywords:
+            automaton.add_word(keyword, keyword)
+        automaton.make_automaton()
+        return automaton
+
+    def _contains_keyword(self, text):
+        """Проверяет, есть ли в тексте (в нижнем регистре) одно из ключевых слов"""
+        if self._keyword_automaton is None:
+            return any(keyword in text for keyword in self._keywords_lower)
+        return next(self._keyword_automaton.iter(text), None) is not None
+
+    def _create_recognizer(self, sample_rate, keywords_json, grammar_only):
+        """
+        Создает распознаватель Vosk
+
+        С grammar_only декодер ограничен грамматикой из ключевых слов (и [unk] при
+        detect_on_partial), а дополнительная работа (альтернативы, тайминги слов)
+        отключена - нам нужен только текст.
+        """
+        if not grammar_only:
+            return vosk.KaldiRecognizer(self.model, sample_rate)
+
+        recognizer = vosk.KaldiRecognizer(self.model, sample_rate, keywords_json)
+        recognizer.SetMaxAlternatives(0)
+        recognizer.SetWords(False)
+        if hasattr(recognizer, 'SetPartialWords'):  # есть только в новых версиях vosk
+            recognizer.SetPartialWords(False)
+        return recognizer
+
+    def reset(self):
+        """
+        Сбрасывает состояние перед новым ожиданием ключевого слова
+
+        Распознаватель переиспользуется, сбрасывается только его решетка. Pre-trigger
+        буфер очищается: аудио до прошлой записи не должно попасть в начало следующей.
+        """
+        if self.recognizer:
+            self.recognizer.Reset()
+        self._write_pos = 0
+        self._filled = 0
+        self._hangover_left = 0
+
+    def _to_pcm(self, audio_data):
+        """Возвращает блок в int16; float32 конвертируется в переиспользуемый буфер"""
+        if audio_data.dtype == np.int16:
+            return audio_data
+        n = len(audio_data)
+        if n > len(self._pcm_buffer):
+            self._pcm_buffer = np.empty(n, dtype=np.int16)
+        return float32_to_int16(audio_data, out=self._pcm_buffer[:n])
+
     def add_audio_to_buffer(self, audio_data):
-        """Добавляет аудио данные в кольцевой буфер"""
-        self.audio_buffer.extend(audio_data)
+        """
+        Добавляет аудио данные (int16 или float32) в кольцевой буфер
+
+        Returns:
+            numpy array int16 с данными блока
+        """
+        pcm = self._to_pcm(audio_data)
+        self._write_pos = write_ring_buffer(self.audio_buffer, self._write_pos, pcm)
+        self._filled = min(self._filled + len(pcm), len(self.audio_buffer))
+        return pcm
 
     def get_pre_trigger_audio(self):
-        """Возвращает накопленное pre-trigger аудио"""
-        return np.array(list(self.audio_buffer), dtype=np.float32)
+        """Возвращает накопленное pre-trigger аудио (int16)"""
+        if self._filled < len(self.audio_buffer):
+            return self.audio_buffer[:self._filled].copy()
+        # Буфер заполнен: от позиции записи (самые старые сэмплы) к началу
+        return np.concatenate((self.audio_buffer[self._write_pos:], self.audio_buffer[:self._write_pos]))
+
+    def _ingest(self, audio_data):
+        """
+        Добавляет блок в pre-trigger буфер и считает его энергию за один проход
+
+        Returns:
+            (numpy array int16 с данными блока, средний квадрат амплитуды)
+        """
+        pcm = self._to_pcm(audio_data)
+        self._write_pos, energy_sq = ingest_pcm_chunk(self.audio_buffer, self._write_pos, pcm)
+        self._filled = min(self._filled + len(pcm), len(self.audio_buffer))
+        return pcm, energy_sq
+
+    def _passes_energy_gate(self, energy_sq):
+        """Проверяет, нужно ли передавать чанк в Vosk (громкий чанк или хвост после него)"""
+        if self.energy_gate <= 0:
+            return True
+        if energy_sq >= self.energy_gate * self.energy_gate:
+            self._hangover_left = self._hangover_chunks
+            return True
+        if self._hangover_left > 0:
+            self._hangover_left -= 1
+            return True
+        return False
+
+    @staticmethod
+    def _result_text(raw_result):
+        """Извлекает текст из JSON результата Vosk (финального или промежуточного); JSON разбирается только если в тексте есть экранирование"""
+        match = _RESULT_TEXT_RE.search(raw_result)
+        if not match:
+            return ""
+        text = match.group(1)
+        if '\\' in text:
+            result = json.loads(raw_result)
+            return result.get('text', result.get('partial', ''))
+        return text
 
     def detect_wake_word(self, audio_data):
         """Проверяет наличие ключевого слова в аудио данных"""
         if not self.recognizer:
-            if self.debug:
+            if __debug__ and self.debug:
                 print("🔍 DEBUG: recognizer не инициализирован!")
             return False, ""
 
-        # Добавляем аудио в буфер
-        self.add_audio_to_buffer(audio_data)
-
-        # DEBUG счетчик вызовов
-        if self.debug:
+        # DEBUG счетчик вызовов (с python -O отладочные блоки удаляются целиком)
+        if __debug__ and self.debug:
             if not hasattr(self, '_detect_count'):
                 self._detect_count = 0
                 print("🔍 DEBUG: detect_wake_word начал работу")
@@ -84,24 +240,45 @@ class WakeWordDetector:
             if self._detect_count % 50 == 0:  # каждые 50 вызовов
                 print(f"🔍 DEBUG: detect_wake_word вызван {self._detect_count} раз")
 
-        start_time = time.time()
+        # Запись в pre-trigger буфер и энергия для порога - одним проходом по блоку
+        pcm, energy_sq = self._ingest(audio_data)
+        if not self._passes_energy_gate(energy_sq):
+            # Тишина: блок только сохранен в pre-trigger буфер
+            return False, ""
+
+        # Время детекции измеряется только для отладки
+        start_time = time.perf_counter() if __debug__ and self.debug else None
         try:
-            # Конвертируем float32 в int16 для Vosk
-            audio_int16 = convert_float32_to_int16(audio_data)
+            # Vosk получает bytes из непрерывного int16 буфера - одна копия на блок.
+            # memoryview не подходит: привязка vosk передает в C len(data), что для
+            # int16 представления было бы числом сэмплов, а не байтов
+            audio_int16 = pcm.tobytes()
 
-            # Проверяем финальный результат
+            # Проверяем финальный результат, а пока фраза не закончена - промежуточный:
+            # ключевое слово видно в нем раньше, чем декодер дождется тишины после фразы
             if self.recognizer.AcceptWaveform(audio_int16):
-                result = json.loads(self.recognizer.Result())
-                if 'text' in result and result['text']:
-                    text = result['text'].lower()
-                    if self.debug:
-                        print(f"🔍 Vosk финальный результат: '{text}'")
-                    # Проверяем наличие любого из ключевых слов
-                    if any(keyword in text for keyword in self.keywords):
-                        detection_time = time.time() - start_time
-                        # Получаем pre-trigger аудио
-                        pre_trigger_audio = self.get_pre_trigger_audio()
-                        return True, (text, detection_time, pre_trigger_audio)
+                text = self._result_text(self.recognizer.Result())
+                kind = "финальный"
+            elif self.detect_on_partial:
+                text = self._result_text(self.recognizer.PartialResult())
+                kind = "промежуточный"
+            else:
+                text = ""
+
+            if text:
+                text = text.lower()
+                if __debug__ and self.debug:
+                    print(f"🔍 Vosk {kind} результат: '{text}'")
+                # Проверяем наличие любого из ключевых слов
+                if self._contains_keyword(text):
+                    detection_time = time.perf_counter() - start_time if start_time is not None else 0.0
+                    # Сбрасываем состояние декодера: следующее ожидание ключевого слова
+                    # начинается с чистой решетки, а сработавшая по промежуточному
+                    # результату фраза не сработает повторно в финальном
+                    self.recognizer.Reset()
+                    # Получаем pre-trigger аудио
+                    pre_trigger_audio = self.get_pre_trigger_audio()
+                    return True, (text, detection_time, pre_trigger_audio)
             return False, ""
 
         except Exception as e:
@@ -10,6 +10,26 @@ from pathlib import Path
 # Добавляем путь к проекту
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+# Участники подкаста (колонки по полям, одна позиция - один участник)
+PARTICIPANTS = dict(
+    names=["Максим", "Анна", "Дмитрий", "Елена"],
+    roles=["Модератор", "Техэксперт", "Бизнес-аналитик", "Социолог"],
+    voices=["aidar", "kseniya", "eugene", "baya"],
+    descriptions=[
+        "Опытный журналист, управляет ходом беседы",
+        "IT-специалист с опытом в разработке",
+        "Эксперт по стратегии и рыночному анализу",
+        "Специалист по общественным процессам",
+    ],
+    expertise=[
+        ["журналистика", "медиа", "интервью"],
+        ["программирование", "ИИ", "технологии"],
+        ["бизнес", "экономика", "инвестиции"],
+        ["социология", "культура", "общество"],
+    ],
+)
+
+
 def show_project_structure():
     """Показывает структуру проекта подкастов"""
     print("🎙️ Структура виртуального подкаста:")
@@ -34,9 +54,13 @@ def show_project_structure():
         ("VIRTUAL_PODCAST_README.md", "Документация")
     ]
 
+    # Один scandir на каталог вместо stat() на каждый файл
+    listings = {}
     for file_path, description in components:
-        full_path = base_path / file_path
-        status = "✅" if full_path.exists() else "❌"
+        parent, _, name = file_path.rpartition("/")
+        if parent not in listings:
+            listings[parent] = list_dir_names(base_path / parent)
+        status = "✅" if name in listings[parent] else "❌"
         print(f"{status} {file_path:<35} - {description}")
 
     print("\n📊 Статистика:")
@@ -48,14 +72,30 @@ def show_project_structure():
     print(f"  • Строк кода в podcast/: {count_lines_in_dir(base_path / 'podcast')}")
 
 
+def list_dir_names(directory):
+    """Возвращает множество имен в директории (пустое, если ее нет)"""
+    try:
+        with os.scandir(directory) as entries:
+            return {entry.name for entry in entries}
+    except OSError:
+        return set()
+
+
 def count_lines_in_dir(directory):
     """Подсчитывает строки кода в директории"""
     total_lines = 0
     if directory.exists():
         for py_file in directory.glob("*.py"):
             try:
-                with open(py_file, 'r', encoding='utf-8') as f:
-                    total_lines += len(f.readlines())
+                # Считаем переводы строк в байтах блоками по 64 КБ, без декодирования
+                # и без списка строк; последняя строка без '\n' тоже учитывается
+                with open(py_file, 'rb') as f:
+                    last_block = b''
+                    for block in iter(lambda: f.read(1 << 16), b''):
+                        total_lines += block.count(b'\n')
+                        last_block = block
+                    if last_block and not last_block.endswith(b'\n'):
+                        total_lines += 1
             except:
                 pass
     return total_lines
@@ -66,43 +106,16 @@ def show_participants():
     print("\n👥 Участники подкаста:")
     print("=" * 50)
 
-    participants = [
-        {
-            "name": "Максим",
-            "role": "Модератор",
-            "voice": "aidar",
-            "description": "Опытный журналист, управляет ходом беседы",
-            "expertise": ["журналистика", "медиа", "интервью"]
-        },
-        {
-            "name": "Анна",
-            "role": "Техэксперт",
-            "voice": "kseniya",
-            "description": "IT-специалист с опытом в разработке",
-            "expertise": ["программирование", "ИИ", "технологии"]
-        },
-        {
-            "name": "Дмитрий",
-            "role": "Бизнес-аналитик",
-            "voice": "eugene",
-            "description": "Эксперт по стратегии и рыночному анализу",
-            "expertise": ["бизнес", "экономика", "инвестиции"]
-        },
-        {
-            "name": "Елена",
-            "role": "Социолог",
-            "voice": "baya",
-            "description": "Специалист по общественным процессам",
-            "expertise": ["социология", "культура", "общество"]
-        }
-    ]
-
-    for p in participants:
-        print(f"🎤 {p['name']} ({p['role']})")
-        print(f"   Голос: {p['voice']}")
-        print(f"   {p['description']}")
-        print(f"   Экспертиза: {', '.join(p['expertise'])}")
-        print()
+    # Поля участников хранятся параллельными списками: вывод собирается одним
+    # проходом по zip без обращений к словарям
+    blocks = (
+        f"🎤 {name} ({role})\n"
+        f"   Голос: {voice}\n"
+        f"   {description}\n"
+        f"   Экспертиза: {', '.join(expertise)}\n"
+        for name, role, voice, description, expertise in zip(*PARTICIPANTS.values())
+    )
+    print("\n".join(blocks))
 
 
 def show_usage_examples():
@@ -16,6 +16,7 @@ Speech Assistant API
 Использование: python main.py
 """
 
+import queue
 import sys
 import threading
 import time
@@ -28,10 +29,25 @@ from core.pause_detection import PauseDetector
 from core.speech_recognition import SpeechRecognizer
 from core.text_to_speech import TextToSpeech
 from core.wake_word import WakeWordDetector
+from utils.audio_utils import AudioRingBuffer
 from utils.config import load_config
 from utils.config_keys import ConfigKeys, ConfigSections
 from utils.enums import AssistantState
 from utils.logger import setup_logging_from_config
+from utils.text_filters import SentenceSplitter
+
+
+# Сколько секунд аудио может накопиться, пока рабочий поток занят декодированием
+AUDIO_RING_SECONDS = 2
+
+# Запас сверх лимита записи, после которого основной цикл останавливает запись сам:
+# страховка на случай, если аудио поток перестал присылать блоки
+RECORDING_WATCHDOG_GRACE = 1.0
+
+# Предварительная обработка промпта LLM запускается, только если после первого
+# сегмента Whisper'у остается декодировать хотя бы столько секунд записи: иначе
+# распознавание закончится раньше, а лишний запрос лишь займет сервер LLM
+PREFILL_MIN_TAIL_SECONDS = 3.0
 
 
 class SpeechAssistant:
@@ -59,13 +75,29 @@ class SpeechAssistant:
         # Аудио настройки
         self.sample_rate = self.config[ConfigSections.WAKE_WORD][ConfigKeys.WakeWord.SAMPLE_RATE]
         self.chunk_size = self.config[ConfigSections.WAKE_WORD][ConfigKeys.WakeWord.CHUNK_SIZE]
-
-        # Буферы для записи
-        self.recording_buffer = []
+        # Колбэк получает блоки chunk_size, а обработка идет блоками decode_batch_size:
+        # реже вызывается Python код Vosk и детектора пауз
+        self.decode_batch_size = self.wake_detector.decode_batch_size
+
+        # Аудио колбэк только складывает сэмплы в кольцевой буфер, а декодирование
+        # (Vosk, детектор пауз) выполняет отдельный поток: задержки декодера не
+        # приводят к потере аудио в потоке реального времени PortAudio
+        self.audio_ring = AudioRingBuffer(max(self.sample_rate * AUDIO_RING_SECONDS, 2 * self.decode_batch_size),
+                                          dtype=np.int16)
+        self.audio_ready = threading.Event()
+        self.audio_thread = None
+
+        # Буфер записи (int16, как приходит с микрофона) выделяется целиком в начале
+        # записи, сэмплы копируются в него срезами
+        self.recording_buffer = np.empty(0, dtype=np.int16)
+        self.recording_length = 0
+        self.recording_start_sample = 0  # конец pre-trigger аудио в буфере
+        self.transcription_stream = None  # распознавание идет параллельно записи
         self.recording_lock = threading.Lock()
         self.max_recording_duration = self.config[ConfigSections.ASSISTANT][ConfigKeys.TTS.MAX_RECORDING_DURATION]
+        # Лимит в сэмплах вычисляется один раз: проверка идет на каждом блоке
+        self.max_recording_samples = int(self.sample_rate * self.max_recording_duration)
         self.recording_start_time = None
-        self.recording_timer = None
         self.stop_reason = None  # для отслеживания причины остановки записи
 
         # Настраиваем логирование
@@ -91,55 +123,94 @@ class SpeechAssistant:
         return True
 
     def audio_callback(self, indata, frames, time_info, status):
-        """Колбэк для обработки аудио потока"""
+        """Колбэк аудио потока PortAudio: только копирует сэмплы в кольцевой буфер"""
         if status:
             self.logger.warning(f"Ошибка аудио потока: {status}")
             return
 
-        # DEBUG: проверяем, что колбэк вызывается
-        if self.debug and hasattr(self, '_callback_count'):
-            self._callback_count += 1
-            if self._callback_count % 100 == 0:  # каждые 100 вызовов
-                self.logger.debug(f"audio_callback вызван {self._callback_count} раз")
-        elif self.debug:
-            self._callback_count = 1
-            self.logger.debug("audio_callback начал работу")
-
-        audio_chunk = indata[:, 0]  # первый канал
-
+        # DEBUG: проверяем, что колбэк вызывается (с python -O блок удаляется целиком)
+        if __debug__ and self.debug:
+            if hasattr(self, '_callback_count'):
+                self._callback_count += 1
+                if self._callback_count % 100 == 0:  # каждые 100 вызовов
+                    self.logger.debug(f"audio_callback вызван {self._callback_count} раз")
+            else:
+                self._callback_count = 1
+                self.logger.debug("audio_callback начал работу")
+
+        # Поток открыт с одним каналом int16: буфер PortAudio читается без конвертации
+        self.audio_ring.push(np.frombuffer(indata, dtype=np.int16))
+        self.audio_ready.set()
+
+    def _audio_worker(self):
+        """Рабочий поток: забирает аудио из кольцевого буфера блоками decode_batch_size и обрабатывает"""
+        audio_chunk = np.empty(self.decode_batch_size, dtype=np.int16)
+        reported_dropped = 0
+
+        while not self.should_stop.is_set():
+            if not self.audio_ready.wait(timeout=0.1):
+                continue
+            self.audio_ready.clear()
+
+            while self.audio_ring.pop_into(audio_chunk):
+                try:
+                    self._handle_audio_chunk(audio_chunk)
+                except Exception as e:
+                    self.logger.error(f"Ошибка обработки аудио: {e}")
+
+            if self.audio_ring.dropped != reported_dropped:
+                reported_dropped = self.audio_ring.dropped
+                self.logger.warning(f"Переполнение аудио буфера, потеряно сэмплов: {reported_dropped}")
+
+    def _handle_audio_chunk(self, audio_chunk):
+        """Обрабатывает блок аудио в зависимости от состояния ассистента"""
         with self.recording_lock:
-            if self.state == AssistantState.LISTENING:
-                # Ищем ключевое слово
-                wake_detected, result = self.wake_detector.detect_wake_word(audio_chunk)
-
-                if wake_detected:
-                    text, detection_time, pre_trigger_audio = result
-                    self.logger.info(f"Обнаружено ключевое слово: {text} (время: {detection_time:.3f}s)")
+            state = self.state
+
+        if state == AssistantState.LISTENING:
+            # Декодирование Vosk - самая долгая операция - выполняется без лока, чтобы
+            # не задерживать потоки обработки, которым нужно сменить состояние
+            wake_detected, result = self.wake_detector.detect_wake_word(audio_chunk)
+
+            if wake_detected:
+                text, detection_time, pre_trigger_audio = result
+                with self.recording_lock:
+                    # Пока шло декодирование, состояние могло измениться - тогда результат не нужен
+                    if self.state != AssistantState.LISTENING:
+                        return
+                    if self.debug:
+                        self.logger.info(f"Обнаружено ключевое слово: {text} (время: {detection_time:.3f}s)")
+                    else:
+                        self.logger.info(f"Обнаружено ключевое слово: {text}")
                     self._start_recording(pre_trigger_audio)
-                elif self.debug and result:  # если есть любой текст
-                    self.logger.debug(f"Vosk вернул текст: '{result}', wake_detected={wake_detected}")
+            elif __debug__ and self.debug and result:  # если есть любой текст
+                self.logger.debug(f"Vosk вернул текст: '{result}', wake_detected={wake_detected}")
+            return
 
-            elif self.state == AssistantState.RECORDING:
+        with self.recording_lock:
+            if self.state == AssistantState.RECORDING:
                 # Записываем аудио для распознавания
-                self.recording_buffer.extend(audio_chunk)
-
-                # Проверяем условия остановки записи
-                if self.recording_start_time:
-                    duration = time.time() - self.recording_start_time
-
-                    # Проверяем детекцию пауз
-                    if self.pause_detector.should_stop_recording(audio_chunk, duration):
-                        self.stop_reason = "pause"
-                        if self.debug:
-                            self.logger.debug(f"Остановка по паузе (длительность: {duration:.1f}s)")
-                        # Вызываем без лока, чтобы избежать взаимоблокировки
-                        self._stop_recording_and_process_unsafe()
-                    # Проверяем максимальное время записи
-                    elif duration >= self.max_recording_duration:
-                        self.stop_reason = "timeout"
-                        self.logger.info(f"Достигнут лимит записи ({self.max_recording_duration}с)")
-                        # Вызываем без лока, чтобы избежать взаимоблокировки
-                        self._stop_recording_and_process_unsafe()
+                self._append_recording(audio_chunk)
+
+                # Проверяем условия остановки записи. Длительность считается по числу
+                # записанных сэмплов: без обращения к часам на каждый блок и точно по
+                # времени аудио потока, даже если обработка отстает от записи
+                recorded = self.recording_length - self.recording_start_sample
+                duration = recorded / self.sample_rate
+
+                # Проверяем детекцию пауз
+                if self.pause_detector.should_stop_recording(audio_chunk, duration):
+                    self.stop_reason = "pause"
+                    if __debug__ and self.debug:
+                        self.logger.debug(f"Остановка по паузе (длительность: {duration:.1f}s)")
+                    # Вызываем без лока, чтобы избежать взаимоблокировки
+                    self._stop_recording_and_process_unsafe()
+                # Проверяем максимальное время записи
+                elif recorded >= self.max_recording_samples:
+                    self.stop_reason = "timeout"
+                    self.logger.info(f"Достигнут лимит записи ({self.max_recording_duration}с)")
+                    # Вызываем без лока, чтобы избежать взаимоблокировки
+                    self._stop_recording_and_process_unsafe()
 
     def _start_recording(self, pre_trigger_audio=None):
         """Начинает запись для распознавания"""
@@ -149,26 +220,45 @@ class SpeechAssistant:
         self.pause_detector.reset()
         self.stop_reason = None
 
+        # Буфер на всю максимальную длительность записи (плюс блок запаса: проверка
+        # длительности срабатывает после добавления блока) и pre-trigger аудио
+        pre_trigger_len = len(pre_trigger_audio) if pre_trigger_audio is not None else 0
+        capacity = self.max_recording_samples + self.decode_batch_size + pre_trigger_len
+        self.recording_buffer = np.empty(capacity, dtype=np.int16)
+        self.recording_length = 0
+        self.transcription_stream = self.speech_recognizer.start_stream(self.sample_rate)
+
         # Если есть pre-trigger аудио, используем его как начало записи
-        if pre_trigger_audio is not None and len(pre_trigger_audio) > 0:
-            self.recording_buffer = list(pre_trigger_audio)
-            self.logger.info(f"Начинаю запись с pre-trigger ({len(pre_trigger_audio)} сэмплов)...")
+        if pre_trigger_len > 0:
+            self._append_recording(pre_trigger_audio)
+            self.logger.info(f"Начинаю запись с pre-trigger ({pre_trigger_len} сэмплов)...")
         else:
-            self.recording_buffer = []
             self.logger.info("Начинаю запись...")
 
+        self.recording_start_sample = self.recording_length
         self.recording_start_time = time.time()
-
-        # Отменяем предыдущий таймер если есть
-        if self.recording_timer:
-            self.recording_timer.cancel()
-
-        # Запускаем новый таймер для остановки записи (как fallback)
-        self.recording_timer = threading.Timer(
-            self.max_recording_duration,
-            lambda: self._stop_recording_and_process("timeout")
-        )
-        self.recording_timer.start()
+        # Лимит длительности проверяется в _handle_audio_chunk по числу сэмплов,
+        # отдельный таймер не нужен
+
+    def _append_recording(self, audio_chunk):
+        """Копирует блок в буфер записи; то, что не помещается, отбрасывается"""
+        start = self.recording_length
+        n = min(len(audio_chunk), len(self.recording_buffer) - start)
+        self.recording_buffer[start:start + n] = audio_chunk[:n]
+        self.recording_length = start + n
+        if n > 0:
+            self.transcription_stream.feed(self.recording_buffer[start:start + n])
+
+    def _check_recording_watchdog(self):
+        """Останавливает запись по таймауту, если блоки аудио перестали поступать"""
+        with self.recording_lock:
+            if self.state != AssistantState.RECORDING or self.recording_start_time is None:
+                return
+            if time.time() - self.recording_start_time < self.max_recording_duration + RECORDING_WATCHDOG_GRACE:
+                return
+            self.stop_reason = "timeout"
+            self.logger.warning("Аудио поток не присылает данные, запись остановлена по таймауту")
+            self._stop_recording_and_process_unsafe()
 
     def _stop_recording_and_process(self, reason=None):
         """Останавливает запись и запускает обработку (потокобезопасно)"""
@@ -188,11 +278,6 @@ class SpeechAssistant:
         self.stopping.set()
 
         try:
-            # Отменяем таймер если он работает
-            if self.recording_timer:
-                self.recording_timer.cancel()
-                self.recording_timer = None
-
             # Если причина не передана, используем сохраненную
             if reason is None:
                 reason = self.stop_reason or "unknown"
@@ -208,11 +293,11 @@ class SpeechAssistant:
             else:
                 print(f"⏹️ Запись остановлена ({duration:.1f}с)")
 
-            # Копируем буфер для обработки в отдельном потоке
-            audio_data = np.array(self.recording_buffer.copy(), dtype=np.float32)
+            # Передаем срез без копирования: новая запись выделит новый буфер
+            audio_data = self.recording_buffer[:self.recording_length]
             processing_thread = threading.Thread(
                 target=self._process_recording,
-                args=(audio_data,),
+                args=(audio_data, self.transcription_stream),
                 daemon=True
             )
             processing_thread.start()
@@ -221,8 +306,13 @@ class SpeechAssistant:
             # Сбрасываем флаг остановки после обработки
             self.stopping.clear()
 
-    def _process_recording(self, audio_data):
-        """Обрабатывает записанное аудио (распознавание + LLM + синтез)"""
+    def _process_recording(self, audio_data, transcription_stream):
+        """
+        Обрабатывает записанное аудио (распознавание + LLM + синтез)
+
+        Выполняется в отдельном потоке: блокирующие запросы к LLM и TTS не задерживают
+        audio_callback, который продолжает получать аудио от PortAudio.
+        """
         try:
             if len(audio_data) == 0:
                 self.logger.warning("Пустая запись")
@@ -231,7 +321,7 @@ class SpeechAssistant:
 
             # Распознаем речь
             print("📝 Распознаю речь...")
-            text = self.speech_recognizer.transcribe_audio(audio_data, self.sample_rate)
+            text = self._transcribe_with_prefill(transcription_stream)
 
             if not text.strip():
                 print("❌ Текст не распознан")
@@ -240,23 +330,23 @@ class SpeechAssistant:
 
             print(f"📝 Распознано: {text}")
 
-            # Обрабатываем через LLM
-            response_text = text  # По умолчанию используем оригинальный текст
+            # Обрабатываем через LLM, озвучивая ответ по предложениям по мере генерации
+            spoken = False
+            success = False
 
             if self.llm_engine.is_enabled():
                 self.state = AssistantState.THINKING
-                llm_response = self.llm_engine.process_user_input(text)
+                spoken, success = self._speak_stream(self.llm_engine.process_user_input(text))
 
-                if llm_response:
-                    response_text = llm_response
-                else:
+                if not spoken:
                     print("⚠️ LLM недоступен, использую распознанный текст")
             else:
                 print("ℹ️ LLM отключен, повторяю распознанный текст")
 
-            # Синтезируем и воспроизводим ответ
-            self.state = AssistantState.SYNTHESIZING
-            success = self.tts.synthesize_and_play(response_text)
+            # Без ответа LLM синтезируем и воспроизводим распознанный текст
+            if not spoken:
+                self.state = AssistantState.SYNTHESIZING
+                success = self.tts.synthesize_and_play(text)
 
             if success:
                 print("✅ Воспроизведение завершено")
@@ -268,16 +358,74 @@ class SpeechAssistant:
         finally:
             self._reset_to_listening()
 
+    def _transcribe_with_prefill(self, transcription_stream):
+        """
+        Завершает распознавание записи, параллельно начиная обработку промпта в LLM
+
+        Окна длинной записи уже распознаны во время записи, здесь остается последний фрагмент.
+
+        Как только декодирован первый сегмент, LLM получает его в фоне, и сервер
+        считает префикс промпта, пока Whisper декодирует оставшиеся сегменты.
+        Для коротких реплик, где декодировать почти нечего, предзапрос не делается.
+        """
+        prefill = (self.llm_engine.is_enabled() and self.llm_engine.prefill_on_partial
+                   and transcription_stream.has_pending_decoding(PREFILL_MIN_TAIL_SECONDS))
+
+        text_segments = []
+        for segment_text in transcription_stream.finalize():
+            text_segments.append(segment_text)
+            if prefill and len(text_segments) == 1:
+                threading.Thread(target=self.llm_engine.prefill, args=(segment_text,), daemon=True).start()
+
+        return " ".join(text_segments).strip()
+
+    def _speak_stream(self, chunks):
+        """
+        Озвучивает потоковый ответ LLM по предложениям
+
+        Генерация идет в отдельном потоке, поэтому следующее предложение
+        уже генерируется, пока предыдущее синтезируется и воспроизводится.
+
+        Returns:
+            (было ли что-то озвучено, успешно ли воспроизведение)
+        """
+        sentences = queue.Queue()
+
+        def produce():
+            splitter = SentenceSplitter()
+            try:
+                for chunk in chunks:
+                    for sentence in splitter.feed(chunk):
+                        sentences.put(sentence)
+                tail = splitter.flush()
+                if tail:
+                    sentences.put(tail)
+            finally:
+                sentences.put(None)  # конец потока
+
+        threading.Thread(target=produce, daemon=True).start()
+
+        spoken = False
+        success = True
+        while True:
+            sentence = sentences.get()
+            if sentence is None:
+                break
+            self.state = AssistantState.SYNTHESIZING
+            success = self.tts.synthesize_and_play(sentence) and success
+            spoken = True
+
+        return spoken, success
+
     def _reset_to_listening(self):
         """Возвращает состояние к прослушиванию ключевых слов"""
         with self.recording_lock:
-            # Отменяем таймер если активен
-            if self.recording_timer:
-                self.recording_timer.cancel()
-                self.recording_timer = None
-
+            # Пока состояние не LISTENING, рабочий поток не обращается к детектору
+            self.wake_detector.reset()
             self.state = AssistantState.LISTENING
-            self.recording_buffer = []
+            self.recording_buffer = np.empty(0, dtype=np.int16)
+            self.recording_length = 0
+            self.transcription_stream = None
             self.recording_start_time = None
         print("👂 Жду ключевое слово...")
 
@@ -297,17 +445,24 @@ class SpeechAssistant:
 
         self._reset_to_listening()
 
+        self.audio_thread = threading.Thread(target=self._audio_worker, daemon=True)
+        self.audio_thread.start()
+
         try:
             # Запускаем аудио поток
-            with sd.InputStream(
+            # Vosk и детекторы работают с int16, поэтому PortAudio сразу отдает int16:
+            # вдвое меньше данных и никакой конвертации на каждый блок. В float32 для
+            # Whisper переводятся только записанные реплики
+            with sd.RawInputStream(
                 callback=self.audio_callback,
                 channels=1,
                 samplerate=self.sample_rate,
                 blocksize=self.chunk_size,
-                dtype='float32'
+                dtype='int16'
             ):
                 while not self.should_stop.is_set():
                     time.sleep(0.1)
+                    self._check_recording_watchdog()
 
         except KeyboardInterrupt:
             print("\n🛑 Остановка ассистента...")
@@ -316,6 +471,9 @@ class SpeechAssistant:
             print(f"❌ Критическая ошибка: {e}")
             self.should_stop.set()
 
+        self.audio_thread.join(timeout=1.0)
+        self.tts.close()
+        self.llm_engine.shutdown()
         print("✅ Ассистент остановлен")
 
 
@@ -5,11 +5,29 @@ This module handles enriching podcast topics with additional context
 through various search providers (mock, web, MCP servers).
 """
 
+import heapq
+import threading
 import time
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Any
 import random
+import re
+from operator import attrgetter
+
+try:
+    import diskcache
+except ImportError:  # diskcache не установлен - результаты веб-поиска кэшируются только в памяти
+    diskcache = None
+
+
+# Сколько обогащенных контекстов (по нормализованной теме) хранится в кэше
+CONTEXT_CACHE_SIZE = 128
+
+# Сколько результатов веб-поиска (по запросу) хранится в памяти
+SEARCH_CACHE_SIZE = 256
 
 
 @dataclass
@@ -72,7 +90,10 @@ class SearchProvider(ABC):
 class MockSearchProvider(SearchProvider):
     """Mock провайдер для тестирования и работы без интернета"""
 
-    def __init__(self):
+    def __init__(self, simulate_latency: float = 0.0):
+        # Искусственная задержка поиска в секундах (по умолчанию без задержки)
+        self._latency = simulate_latency
+
         # Предзаготовленные результаты для разных тем
         self.mock_data = {
             "искусственный интеллект": [
@@ -148,17 +169,31 @@ class MockSearchProvider(SearchProvider):
             ]
         }
 
+        # Индекс строится один раз: ключевое слово -> номера тем, и одно регулярное
+        # выражение со всеми ключевыми словами. Как и раньше, слово ищется подстрокой
+        # запроса ("интеллект" находится в "интеллекта")
+        self._topic_results = list(self.mock_data.values())
+        self._keyword_topics: Dict[str, List[int]] = {}
+        for index, topic in enumerate(self.mock_data):
+            for keyword in topic.split():
+                self._keyword_topics.setdefault(keyword, []).append(index)
+        keywords = sorted(self._keyword_topics, key=len, reverse=True)
+        self._keyword_re = re.compile('|'.join(map(re.escape, keywords)))
+
     def search(self, query: str, max_results: int = 5) -> List[SearchResult]:
         """Выполняет mock поиск"""
-        time.sleep(0.5)  # имитируем задержку поиска
+        if self._latency:
+            time.sleep(self._latency)  # имитируем задержку поиска
 
         query_lower = query.lower()
 
-        # Ищем подходящие результаты по ключевым словам
-        results = []
-        for topic, topic_results in self.mock_data.items():
-            if any(keyword in query_lower for keyword in topic.split()):
-                results.extend(topic_results)
+        # Ищем подходящие темы по ключевым словам за один проход по запросу
+        matched_topics = {
+            index
+            for match in self._keyword_re.finditer(query_lower)
+            for index in self._keyword_topics[match.group()]
+        }
+        results = [result for index in sorted(matched_topics) for result in self._topic_results[index]]
 
         # Если ничего не найдено, возвращаем общие результаты
         if not results:
@@ -179,9 +214,8 @@ class MockSearchProvider(SearchProvider):
                 )
             ]
 
-        # Сортируем по релевантности и ограничиваем количество
-        results.sort(key=lambda x: x.relevance_score, reverse=True)
-        return results[:max_results]
+        # Лучшие max_results по релевантности без сортировки всего списка
+        return heapq.nlargest(max_results, results, key=attrgetter('relevance_score'))
 
     def is_available(self) -> bool:
         """Mock провайдер всегда доступен"""
@@ -191,14 +225,63 @@ class MockSearchProvider(SearchProvider):
 class WebSearchProvider(SearchProvider):
     """Провайдер для веб-поиска (заглушка для будущей реализации)"""
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, cache_ttl: float = 3600,
+                 cache_dir: Optional[str] = None):
         self.api_key = api_key
 
+        # Результаты кэшируются на cache_ttl секунд: в памяти и, если указан
+        # cache_dir и установлен diskcache, на диске (переживают перезапуск)
+        self.cache_ttl = cache_ttl
+        self._mem_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._disk_cache = diskcache.Cache(cache_dir) if cache_dir and diskcache is not None else None
+
     def search(self, query: str, max_results: int = 5) -> List[SearchResult]:
+        """Выполняет веб-поиск, повторные запросы обслуживаются из кэша"""
+        key = f"{max_results}:{query.strip().lower()}"
+        results = self._get_cached(key)
+        if results is None:
+            results = self._search_remote(query, max_results)
+            self._store_cached(key, results)
+        return results
+
+    def _search_remote(self, query: str, max_results: int) -> List[SearchResult]:
         """Заглушка для веб-поиска"""
         # TODO: Реализовать реальный веб-поиск
         raise NotImplementedError("Web search not implemented yet")
 
+    def _get_cached(self, key: str) -> Optional[List[SearchResult]]:
+        """Возвращает неустаревшие результаты из кэша (сначала из памяти, затем с диска)"""
+        with self._cache_lock:
+            entry = self._mem_cache.get(key)
+            if entry is not None:
+                results, stored_at = entry
+                if time.time() - stored_at < self.cache_ttl:
+                    self._mem_cache.move_to_end(key)
+                    return results
+                del self._mem_cache[key]
+
+        if self._disk_cache is not None:
+            results = self._disk_cache.get(key)  # устаревшие записи diskcache удаляет сам
+            if results is not None:
+                self._store_memory(key, results)
+                return results
+        return None
+
+    def _store_cached(self, key: str, results: List[SearchResult]):
+        """Сохраняет результаты в кэш в памяти и на диске"""
+        self._store_memory(key, results)
+        if self._disk_cache is not None:
+            self._disk_cache.set(key, results, expire=self.cache_ttl)
+
+    def _store_memory(self, key: str, results: List[SearchResult]):
+        """Сохраняет результаты в памяти, вытесняя самые старые записи"""
+        with self._cache_lock:
+            self._mem_cache[key] = (results, time.time())
+            self._mem_cache.move_to_end(key)
+            while len(self._mem_cache) > SEARCH_CACHE_SIZE:
+                self._mem_cache.popitem(last=False)
+
     def is_available(self) -> bool:
         """Проверяет наличие API ключа"""
         return self.api_key is not None
@@ -218,19 +301,58 @@ class PodcastContextEnricher:
         # Настройки поиска
         self.max_results = self.search_config.get('max_results', 5)
         self.timeout = self.search_config.get('timeout', 10)
+        # Сколько поисковых запросов выполняется одновременно в enrich_many
+        self.concurrency = self.search_config.get('concurrency', 8)
+
+        # Кэш результатов по нормализованной теме: повторный запрос темы не ходит в поиск
+        self._cache: "OrderedDict[str, EnrichedContext]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None  # создается при первом параллельном поиске
+        # Запущенные заранее поиски (prefetch) по нормализованной теме
+        self._prefetch: Dict[str, Future] = {}
 
     def _create_search_provider(self, provider_type: str) -> SearchProvider:
         """Создает провайдер поиска по типу"""
         if provider_type == 'mock':
-            return MockSearchProvider()
+            return MockSearchProvider(self.search_config.get('simulate_latency', 0.0))
         elif provider_type == 'web':
             api_key = self.search_config.get('api_key')
-            return WebSearchProvider(api_key)
+            return WebSearchProvider(api_key,
+                                     cache_ttl=self.search_config.get('cache_ttl', 3600),
+                                     cache_dir=self.search_config.get('cache_dir'))
         else:
             raise ValueError(f"Unknown search provider: {provider_type}")
 
     def enrich_context(self, topic: str) -> EnrichedContext:
         """Обогащает контекст для темы подкаста"""
+        key = self._cache_key(topic)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+            future = self._prefetch.pop(key, None)
+
+        # Поиск уже запущен через prefetch - дожидаемся его вместо повторного запроса
+        if future is not None:
+            return future.result()
+        return self._search_context(topic, key)
+
+    def prefetch(self, topic: str) -> None:
+        """
+        Запускает обогащение контекста темы в фоне
+
+        Результат забирает следующий вызов enrich_context для этой темы: поиск
+        выполняется, пока подготавливается остальная часть подкаста.
+        """
+        key = self._cache_key(topic)
+        with self._cache_lock:
+            if key in self._cache or key in self._prefetch:
+                return
+            self._prefetch[key] = self._get_executor().submit(self._search_context, topic, key)
+
+    def _search_context(self, topic: str, key: str) -> EnrichedContext:
+        """Выполняет поиск по теме и кэширует полученный контекст"""
         start_time = time.time()
 
         # Проверяем доступность провайдера
@@ -244,12 +366,45 @@ class PodcastContextEnricher:
 
             # Формируем обогащенный контекст
             context = self._process_search_results(topic, search_results, search_time)
+
+            # Кэшируются только результаты поиска, fallback при ошибке не запоминается
+            with self._cache_lock:
+                self._cache[key] = context
+                if len(self._cache) > CONTEXT_CACHE_SIZE:
+                    self._cache.popitem(last=False)
             return context
 
         except Exception as e:
             print(f"⚠️ Ошибка поиска: {e}")
             return self._create_fallback_context(topic)
 
+    def enrich_many(self, topics: List[str]) -> List[EnrichedContext]:
+        """
+        Обогащает контекст нескольких тем параллельно
+
+        Поиск - это ожидание ответа провайдера, поэтому запросы выполняются в потоках
+        (не более concurrency одновременно): общее время близко к самому долгому
+        запросу, а не к их сумме.
+
+        Returns:
+            Контексты в порядке входных тем
+        """
+        if len(topics) <= 1:
+            return [self.enrich_context(topic) for topic in topics]
+        return list(self._get_executor().map(self.enrich_context, topics))
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Возвращает пул потоков для поиска, создавая его при первом обращении"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=max(1, self.concurrency),
+                                                thread_name_prefix='context_search')
+        return self._executor
+
+    @staticmethod
+    def _cache_key(topic: str) -> str:
+        """Нормализует тему для ключа кэша"""
+        return topic.strip().lower()
+
     def _process_search_results(self, topic: str, search_results: List[SearchResult], search_time: float) -> EnrichedContext:
         """Обрабатывает результаты поиска в обогащенный контекст"""
 
@@ -262,20 +417,23 @@ class PodcastContextEnricher:
 
         # Извлекаем факты из результатов поиска
         facts = []
-        sources = []
+        unique_sources: Dict[str, None] = {}
 
         for result in search_results:
-            if result.summary and len(result.summary) > 20:
+            if result.summary and len(result.summary) > 20 and len(facts) < 6:
                 facts.append(result.summary)
 
+            # dict вместо списка: дубликаты отбрасываются, порядок по релевантности сохраняется
             if result.url:
-                sources.append(result.url)
+                unique_sources[result.url] = None
             elif result.source:
-                sources.append(result.source)
+                unique_sources[result.source] = None
+
+            # Фактов и источников уже достаточно - остальные результаты не нужны
+            if len(facts) >= 6 and len(unique_sources) >= 4:
+                break
 
-        # Ограничиваем количество фактов
-        facts = facts[:6]
-        sources = list(set(sources))[:4]  # убираем дубликаты
+        sources = list(unique_sources)[:4]
 
         provider_name = type(self.search_provider).__name__.replace('SearchProvider', '').lower()
 
@@ -308,6 +466,8 @@ class PodcastContextEnricher:
     def refresh_context(self, topic: str, current_context: EnrichedContext) -> EnrichedContext:
         """Обновляет контекст (например, по запросу модератора)"""
         print(f"🔄 Обновление контекста для темы: {topic}")
+        with self._cache_lock:
+            self._cache.pop(self._cache_key(topic), None)
         return self.enrich_context(topic)
 
     def is_search_enabled(self) -> bool:
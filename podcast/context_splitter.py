@@ -5,11 +5,92 @@ This module handles distributing enriched context among different
 participants based on their roles and expertise areas.
 """
 
-from typing import Dict, List, Any, Optional
+import functools
+import heapq
+import re
+from typing import Dict, List, Any, Optional, Pattern, Tuple
 from .persona import ParticipantProfile, ParticipantRole
 from .context_enricher import EnrichedContext
 
 
+# Фразы модератора для переходов между выступлениями
+TRANSITION_PHRASES: Tuple[str, ...] = (
+    "Интересная точка зрения! А что думает по этому поводу",
+    "Спасибо за комментарий. Хотелось бы услышать мнение",
+    "Это поднимает важный вопрос. Как видит эту проблему",
+    "Давайте рассмотрим другой аспект. Что скажет",
+    "Отличный анализ! А как это связано с опытом",
+)
+
+# Советы по стилю общения спикера (неизвестный стиль получает professional)
+STYLE_TIPS: Dict[str, Tuple[str, ...]] = {
+    "professional": (
+        "Используй структурированные ответы",
+        "Приводи конкретные примеры",
+        "Ссылайся на данные и исследования",
+        "Поддерживай деловой тон"
+    ),
+    "casual": (
+        "Говори простым языком",
+        "Используй понятные аналогии",
+        "Делись личным опытом",
+        "Будь дружелюбным и открытым"
+    ),
+    "academic": (
+        "Структурируй информацию логично",
+        "Ссылайся на исследования и теории",
+        "Используй точную терминологию",
+        "Анализируй причинно-следственные связи"
+    ),
+    "enthusiastic": (
+        "Проявляй энергию и интерес",
+        "Используй яркие примеры",
+        "Выражай эмоции по поводу темы",
+        "Мотивируй других участников"
+    ),
+    "analytical": (
+        "Структурируй ответы по пунктам",
+        "Приводи цифры и статистику",
+        "Анализируй плюсы и минусы",
+        "Делай обоснованные выводы"
+    ),
+    "thoughtful": (
+        "Рассматривай вопрос с разных сторон",
+        "Делись размышлениями и сомнениями",
+        "Поднимай глубокие вопросы",
+        "Проявляй эмпатию к разным точкам зрения"
+    )
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _expertise_matcher(expertise_areas: Tuple[str, ...]) -> Optional[Pattern[str]]:
+    """
+    Строит (и кэширует для набора областей) выражение для поиска слов экспертизы
+
+    Слова ищутся подстрокой текста в нижнем регистре, как и раньше: "технолог"
+    находит "технологии". Одно выражение заменяет проверку каждого слова отдельно.
+    """
+    keywords = {keyword for area in expertise_areas for keyword in area.lower().split()}
+    if not keywords:
+        return None
+    return re.compile('|'.join(map(re.escape, sorted(keywords, key=len, reverse=True))))
+
+
+def _top_by_expertise(texts: List[str], expertise_areas: List[str], limit: int) -> List[int]:
+    """
+    Возвращает индексы до limit текстов с наибольшим числом вхождений слов экспертизы
+
+    Тексты без вхождений не возвращаются; при равном счете сохраняется исходный
+    порядок (он уже отсортирован по релевантности поиска).
+    """
+    matcher = _expertise_matcher(tuple(expertise_areas))
+    if matcher is None:
+        return []
+    scores = [len(matcher.findall(text.lower())) for text in texts]
+    return heapq.nlargest(limit, (i for i, score in enumerate(scores) if score), key=scores.__getitem__)
+
+
 class ContextSplitter:
     """Распределяет контекст между участниками подкаста"""
 
@@ -76,13 +157,7 @@ class ContextSplitter:
             "full_facts": enriched_context.facts,
             "search_results_summary": self._summarize_search_results(enriched_context),
             "discussion_points": self._generate_discussion_points(enriched_context),
-            "transition_phrases": [
-                "Интересная точка зрения! А что думает по этому поводу",
-                "Спасибо за комментарий. Хотелось бы услышать мнение",
-                "Это поднимает важный вопрос. Как видит эту проблему",
-                "Давайте рассмотрим другой аспект. Что скажет",
-                "Отличный анализ! А как это связано с опытом"
-            ]
+            "transition_phrases": list(TRANSITION_PHRASES)
         }
 
         return context
@@ -127,18 +202,8 @@ class ContextSplitter:
         if not expertise_areas:
             return facts[:3]  # возвращаем первые 3 факта если нет специализации
 
-        relevant_facts = []
-        expertise_keywords = set()
-
-        # Собираем ключевые слова из областей экспертизы
-        for area in expertise_areas:
-            expertise_keywords.update(area.lower().split())
-
-        # Фильтруем факты по ключевым словам
-        for fact in facts:
-            fact_lower = fact.lower()
-            if any(keyword in fact_lower for keyword in expertise_keywords):
-                relevant_facts.append(fact)
+        # Самые близкие к областям экспертизы факты - по числу вхождений ключевых слов
+        relevant_facts = [facts[i] for i in _top_by_expertise(facts, expertise_areas, 4)]
 
         # Если релевантных фактов мало, добавляем общие
         if len(relevant_facts) < 2:
@@ -155,18 +220,8 @@ class ContextSplitter:
         if not expertise_areas or not search_results:
             return search_results[:2]
 
-        relevant_results = []
-        expertise_keywords = set()
-
-        for area in expertise_areas:
-            expertise_keywords.update(area.lower().split())
-
-        for result in search_results:
-            result_text = (result.title + " " + result.summary).lower()
-            if any(keyword in result_text for keyword in expertise_keywords):
-                relevant_results.append(result)
-
-        return relevant_results[:3]
+        texts = [result.title + " " + result.summary for result in search_results]
+        return [search_results[i] for i in _top_by_expertise(texts, expertise_areas, 3)]
 
     def _summarize_search_results(self, enriched_context: EnrichedContext) -> str:
         """Создает краткое резюме результатов поиска для модератора"""
@@ -212,46 +267,7 @@ class ContextSplitter:
 
     def _get_speaking_style_tips(self, speaking_style: str) -> List[str]:
         """Возвращает советы по стилю общения"""
-        style_tips = {
-            "professional": [
-                "Используй структурированные ответы",
-                "Приводи конкретные примеры",
-                "Ссылайся на данные и исследования",
-                "Поддерживай деловой тон"
-            ],
-            "casual": [
-                "Говори простым языком",
-                "Используй понятные аналогии",
-                "Делись личным опытом",
-                "Будь дружелюбным и открытым"
-            ],
-            "academic": [
-                "Структурируй информацию логично",
-                "Ссылайся на исследования и теории",
-                "Используй точную терминологию",
-                "Анализируй причинно-следственные связи"
-            ],
-            "enthusiastic": [
-                "Проявляй энергию и интерес",
-                "Используй яркие примеры",
-                "Выражай эмоции по поводу темы",
-                "Мотивируй других участников"
-            ],
-            "analytical": [
-                "Структурируй ответы по пунктам",
-                "Приводи цифры и статистику",
-                "Анализируй плюсы и минусы",
-                "Делай обоснованные выводы"
-            ],
-            "thoughtful": [
-                "Рассматривай вопрос с разных сторон",
-                "Делись размышлениями и сомнениями",
-                "Поднимай глубокие вопросы",
-                "Проявляй эмпатию к разным точкам зрения"
-            ]
-        }
-
-        return style_tips.get(speaking_style, style_tips["professional"])
+        return list(STYLE_TIPS.get(speaking_style, STYLE_TIPS["professional"]))
 
     def get_context_summary_for_participant(self,
                                           participant_context: Dict[str, Any]) -> str:
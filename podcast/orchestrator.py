@@ -60,6 +60,9 @@ class PodcastOrchestrator:
         """
         print(f"🎙️ Запуск виртуального подкаста на тему: {topic}")
 
+        # Поиск по теме идет в фоне, пока создается сессия и настраиваются участники
+        self.context_enricher.prefetch(topic)
+
         # Создаем сессию
         session_id = f"podcast_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         max_rounds = rounds or self.podcast_config.get('default_rounds', 3)
@@ -0,0 +1,63 @@
+"""
+Tests for audio utilities
+"""
+
+import numpy as np
+
+from utils.audio_utils import AudioRingBuffer
+
+
+class TestAudioRingBuffer:
+    """Тесты для AudioRingBuffer"""
+
+    def test_capacity_rounded_to_power_of_two(self):
+        """Тест округления емкости до степени двойки"""
+        assert AudioRingBuffer(5, dtype=np.int16).capacity == 8
+        assert AudioRingBuffer(8, dtype=np.int16).capacity == 8
+        assert AudioRingBuffer(1, dtype=np.int16).capacity == 2
+
+    def test_push_pop_roundtrip(self):
+        """Тест записи и чтения блока"""
+        ring = AudioRingBuffer(8, dtype=np.int16)
+        assert ring.push(np.arange(5, dtype=np.int16))
+        assert len(ring) == 5
+
+        out = np.empty(5, dtype=np.int16)
+        assert ring.pop_into(out)
+        np.testing.assert_array_equal(out, np.arange(5))
+        assert len(ring) == 0
+
+    def test_wrap_around(self):
+        """Тест записи и чтения через границу массива"""
+        ring = AudioRingBuffer(8, dtype=np.int16)
+        out = np.empty(6, dtype=np.int16)
+        ring.push(np.arange(6, dtype=np.int16))
+        ring.pop_into(out)
+
+        # Позиция записи 6: блок из 6 сэмплов переходит через конец массива
+        assert ring.push(np.arange(10, 16, dtype=np.int16))
+        assert ring.pop_into(out)
+        np.testing.assert_array_equal(out, np.arange(10, 16))
+
+    def test_overflow_drops_block_and_counts(self):
+        """Тест отбрасывания блока при переполнении"""
+        ring = AudioRingBuffer(8, dtype=np.int16)
+        assert ring.push(np.arange(6, dtype=np.int16))
+        assert not ring.push(np.arange(3, dtype=np.int16))
+        assert ring.dropped == 3
+        assert len(ring) == 6
+
+        # Уже записанные данные не повреждены
+        out = np.empty(6, dtype=np.int16)
+        assert ring.pop_into(out)
+        np.testing.assert_array_equal(out, np.arange(6))
+
+    def test_pop_into_underflow(self):
+        """Тест чтения при недостатке данных"""
+        ring = AudioRingBuffer(8, dtype=np.int16)
+        ring.push(np.arange(3, dtype=np.int16))
+
+        out = np.full(4, -1, dtype=np.int16)
+        assert not ring.pop_into(out)
+        np.testing.assert_array_equal(out, [-1, -1, -1, -1])
+        assert len(ring) == 3
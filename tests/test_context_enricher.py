@@ -5,6 +5,7 @@ Tests for context enricher functionality
 import pytest
 from podcast.context_enricher import (
     MockSearchProvider,
+    WebSearchProvider,
     PodcastContextEnricher,
     SearchResult,
     EnrichedContext
@@ -47,6 +48,13 @@ class TestMockSearchProvider:
         assert len(results) >= 1
         assert any("общая информация" in result.title.lower() or "тренды" in result.title.lower() for result in results)
 
+    def test_mock_provider_simulated_latency(self):
+        """Тест настройки искусственной задержки mock провайдера"""
+        assert MockSearchProvider()._latency == 0.0
+
+        enricher = PodcastContextEnricher({'search': {'provider': 'mock', 'simulate_latency': 0.01}})
+        assert enricher.search_provider._latency == 0.01
+
     def test_mock_search_max_results_limit(self):
         """Тест ограничения количества результатов"""
         provider = MockSearchProvider()
@@ -76,6 +84,40 @@ class TestMockSearchProvider:
         assert len(result.summary) > 0
 
 
+class TestWebSearchProvider:
+    """Тесты кэша WebSearchProvider"""
+
+    class CountingProvider(WebSearchProvider):
+        """Провайдер с подсчетом обращений к сети"""
+
+        def __init__(self, **kwargs):
+            super().__init__(api_key="test", **kwargs)
+            self.remote_calls = 0
+
+        def _search_remote(self, query, max_results):
+            self.remote_calls += 1
+            return [SearchResult(title=query, summary="summary", relevance_score=1.0)]
+
+    def test_repeated_query_uses_cache(self):
+        """Тест повторного запроса из кэша"""
+        provider = self.CountingProvider()
+
+        first = provider.search("Климат", max_results=3)
+        second = provider.search("  климат ", max_results=3)
+
+        assert second == first
+        assert provider.remote_calls == 1
+
+    def test_expired_cache_entry(self):
+        """Тест повторного поиска после истечения TTL"""
+        provider = self.CountingProvider(cache_ttl=0)
+
+        provider.search("климат")
+        provider.search("климат")
+
+        assert provider.remote_calls == 2
+
+
 class TestPodcastContextEnricher:
     """Тесты для PodcastContextEnricher"""
 
@@ -143,6 +185,41 @@ class TestPodcastContextEnricher:
         assert refreshed_context.topic == "образование"
         # Обновленный контекст может отличаться от оригинального
 
+    def test_context_cache(self):
+        """Тест кэширования контекста по нормализованной теме"""
+        config = {'search': {'provider': 'mock'}}
+        enricher = PodcastContextEnricher(config)
+
+        context = enricher.enrich_context("образование")
+        assert enricher.enrich_context("  Образование ") is context
+
+        refreshed_context = enricher.refresh_context("образование", context)
+        assert refreshed_context is not context
+        assert enricher.enrich_context("образование") is refreshed_context
+
+    def test_enrich_many(self):
+        """Тест параллельного обогащения нескольких тем"""
+        config = {'search': {'provider': 'mock', 'simulate_latency': 0.05}}
+        enricher = PodcastContextEnricher(config)
+        topics = ["криптовалюта", "климат", "образование", "искусственный интеллект"]
+
+        contexts = enricher.enrich_many(topics)
+
+        assert [context.topic for context in contexts] == topics
+        assert all(len(context.facts) > 0 for context in contexts)
+
+    def test_prefetch(self):
+        """Тест фонового обогащения контекста"""
+        config = {'search': {'provider': 'mock', 'simulate_latency': 0.05}}
+        enricher = PodcastContextEnricher(config)
+
+        enricher.prefetch("климат")
+        context = enricher.enrich_context("климат")
+
+        assert context.topic == "климат"
+        assert len(context.facts) > 0
+        assert enricher.enrich_context("климат") is context
+
     def test_search_availability_check(self):
         """Тест проверки доступности поиска"""
         config = {'search': {'provider': 'mock'}}
@@ -0,0 +1,115 @@
+"""
+Tests for context splitter functionality
+"""
+
+import pytest
+from podcast.context_enricher import EnrichedContext, SearchResult
+from podcast.context_splitter import ContextSplitter
+from podcast.persona import create_default_moderator, create_tech_expert
+
+
+def make_context(facts=None):
+    """Создает обогащенный контекст для тестов"""
+    return EnrichedContext(
+        topic="тест",
+        overview="Обзор темы",
+        facts=facts if facts is not None else ["Технологии развиваются", "Общий факт о теме"],
+        sources=["https://example.com"]
+    )
+
+
+class TestSplitContext:
+    """Тесты распределения контекста между участниками"""
+
+    def test_repeated_split_returns_equal_result(self):
+        """Тест: повторное распределение дает тот же результат"""
+        splitter = ContextSplitter()
+        context = make_context()
+        participants = {"moderator": create_default_moderator(), "tech_expert": create_tech_expert()}
+
+        first = splitter.split_context_for_participants(context, participants)
+        second = splitter.split_context_for_participants(context, participants)
+
+        assert second == first
+
+    def test_mutating_result_does_not_affect_next_split(self):
+        """Тест: изменение результата не затрагивает следующее распределение"""
+        splitter = ContextSplitter()
+        context = make_context()
+        participants = {"moderator": create_default_moderator(), "tech_expert": create_tech_expert()}
+
+        first = splitter.split_context_for_participants(context, participants)
+        expected_facts = list(first["tech_expert"]["relevant_facts"])
+        expected_points = list(first["moderator"]["discussion_points"])
+
+        first["tech_expert"]["relevant_facts"].append("чужой факт")
+        first["tech_expert"]["topic"] = "другая тема"
+        first["moderator"]["discussion_points"].clear()
+        del first["moderator"]
+
+        second = splitter.split_context_for_participants(context, participants)
+
+        assert second["tech_expert"]["relevant_facts"] == expected_facts
+        assert second["tech_expert"]["topic"] == "тест"
+        assert second["moderator"]["discussion_points"] == expected_points
+
+
+class TestExpertiseRanking:
+    """Тесты отбора фактов и результатов поиска по экспертизе"""
+
+    EXPERTISE = ["блокчейн", "финансы"]
+
+    def test_facts_ranked_by_keyword_count(self):
+        """Тест сортировки фактов по числу вхождений с ограничением в 4"""
+        facts = [
+            "Про погоду",                     # 0 вхождений
+            "Блокчейн меняет финансы",        # 2
+            "Финансы растут",                 # 1
+            "Блокчейн, блокчейн и финансы",   # 3
+            "Блокчейн",                       # 1
+            "Финансы и блокчейн",             # 2
+        ]
+
+        result = ContextSplitter()._filter_facts_by_expertise(facts, self.EXPERTISE)
+
+        # При равном счете сохраняется исходный порядок, пятый факт не попадает в лимит
+        assert result == [
+            "Блокчейн, блокчейн и финансы",
+            "Блокчейн меняет финансы",
+            "Финансы и блокчейн",
+            "Финансы растут",
+        ]
+
+    def test_few_relevant_facts_padded_with_general(self):
+        """Тест дополнения общими фактами, если релевантных меньше двух"""
+        facts = ["Общий факт A", "Факт про финансы", "Общий факт B", "Общий факт C"]
+
+        result = ContextSplitter()._filter_facts_by_expertise(facts, self.EXPERTISE)
+
+        assert result == ["Факт про финансы", "Общий факт A", "Общий факт B"]
+
+    def test_facts_without_expertise(self):
+        """Тест отбора первых трех фактов без областей экспертизы"""
+        facts = ["A", "B", "C", "D"]
+
+        assert ContextSplitter()._filter_facts_by_expertise(facts, []) == ["A", "B", "C"]
+
+    def test_search_results_ranked_with_limit(self):
+        """Тест сортировки результатов поиска с ограничением в 3"""
+        results = [
+            SearchResult(title="Погода", summary="Без совпадений"),
+            SearchResult(title="Финансы", summary="Общий обзор"),
+            SearchResult(title="Блокчейн и финансы", summary="Блокчейн в банках"),
+            SearchResult(title="Рынки", summary="Финансы компаний"),
+            SearchResult(title="Блокчейн", summary="Финансы и блокчейн"),
+        ]
+
+        ranked = ContextSplitter()._filter_search_results_by_expertise(results, self.EXPERTISE)
+
+        assert [r.title for r in ranked] == ["Блокчейн и финансы", "Блокчейн", "Финансы"]
+
+    def test_search_results_without_matches(self):
+        """Тест пустого результата, если совпадений нет"""
+        results = [SearchResult(title="Погода", summary="Без совпадений")]
+
+        assert ContextSplitter()._filter_search_results_by_expertise(results, self.EXPERTISE) == []
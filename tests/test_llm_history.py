@@ -0,0 +1,108 @@
+"""
+Tests for LLM conversation history compaction
+"""
+
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("openai")
+
+from core.llm_engine import (
+    HISTORY_SUMMARY_PREFIX,
+    append_message,
+    compact_history,
+    estimate_tokens
+)
+
+
+def make_history(roles, length=80):
+    """История: системный промпт и сообщения заданных ролей длиной length символов"""
+    history = [{"role": "system", "content": "system prompt"}]
+    for index, role in enumerate(roles):
+        history.append({"role": role, "content": f"{role}{index}:" + "x" * length})
+    return history
+
+
+class TestCompactHistory:
+    """Тесты для compact_history"""
+
+    def test_under_budget_returns_same_history(self):
+        """Тест: история в пределах бюджета не изменяется"""
+        history = make_history(["user", "assistant", "user"], length=10)
+
+        assert compact_history(history, max_context_tokens=4096, keep_last_n=2) is history
+
+    def test_short_history_not_compacted(self):
+        """Тест: сообщений не больше keep_last_n - сжимать нечего"""
+        history = make_history(["user", "assistant", "user"])
+
+        assert compact_history(history, max_context_tokens=10, keep_last_n=6) is history
+
+    def test_recent_window_starts_with_user(self):
+        """Тест: сохраненная часть начинается с сообщения пользователя"""
+        history = make_history(["user", "assistant"] * 3 + ["user"])
+
+        compacted = compact_history(history, max_context_tokens=100, keep_last_n=6)
+
+        assert compacted[0] is history[0]
+        assert compacted[1]["role"] == "system"
+        assert compacted[1]["content"].startswith(HISTORY_SUMMARY_PREFIX)
+        roles = [message["role"] for message in compacted[2:]]
+        assert roles == ["user", "assistant", "user", "assistant", "user"]
+        assert compacted[2:] == history[-5:]
+
+    def test_recent_window_already_on_user(self):
+        """Тест: граница на сообщении пользователя не сдвигается"""
+        history = make_history(["user", "assistant"] * 4)
+
+        compacted = compact_history(history, max_context_tokens=100, keep_last_n=4)
+
+        assert compacted[2:] == history[-4:]
+        assert compacted[2]["role"] == "user"
+
+    def test_summary_carried_over(self):
+        """Тест: предыдущая сводка переносится в новую, а не дублируется"""
+        history = [
+            {"role": "system", "content": "system prompt"},
+            {"role": "system", "content": HISTORY_SUMMARY_PREFIX + "старая сводка"},
+            {"role": "user", "content": "вопрос"},
+            {"role": "assistant", "content": "ответ"},
+            {"role": "user", "content": "u" * 1200},
+            {"role": "assistant", "content": "a" * 1200},
+            {"role": "user", "content": "q" * 1200},
+        ]
+
+        compacted = compact_history(history, max_context_tokens=1000, keep_last_n=2)
+
+        summaries = [m for m in compacted if m["content"].startswith(HISTORY_SUMMARY_PREFIX)]
+        assert len(summaries) == 1
+        assert summaries[0]["content"].count(HISTORY_SUMMARY_PREFIX) == 1
+        assert "старая сводка" in summaries[0]["content"]
+        assert compacted[2]["role"] == "user"
+
+
+class TestAppendMessage:
+    """Тесты для append_message"""
+
+    def test_append_tracks_tokens_and_indices(self):
+        """Тест обновления оценки токенов и индексов без сжатия"""
+        history = make_history([])
+        tokens = estimate_tokens(history)
+
+        history, tokens, indices = append_message(history, "user", "привет", tokens, (-1, -1), 4096, 6)
+        history, tokens, indices = append_message(history, "assistant", "здравствуйте", tokens, indices, 4096, 6)
+
+        assert indices == (1, 2)
+        assert tokens == estimate_tokens(history)
+
+    def test_append_recomputes_after_compaction(self):
+        """Тест пересчета индексов и токенов после сжатия"""
+        history = make_history(["user", "assistant"] * 3)
+        tokens = estimate_tokens(history)
+
+        compacted, tokens, indices = append_message(history, "user", "y" * 80, tokens, (5, 6), 100, 4)
+
+        assert compacted is not history
+        assert tokens == estimate_tokens(compacted)
+        assert compacted[indices[0]]["content"] == "y" * 80
+        assert compacted[indices[1]]["role"] == "assistant"
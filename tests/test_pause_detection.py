@@ -0,0 +1,101 @@
+"""
+Tests for pause detection
+"""
+
+import numpy as np
+import pytest
+from core.pause_detection import PauseDetector
+
+SAMPLE_RATE = 16000
+BLOCK = 4000  # 0.25 с
+
+
+def make_detector(pause_threshold=1.0, min_recording_duration=0.5):
+    """Создает детектор с паузой pause_threshold секунд"""
+    config = {
+        'voice_detection': {
+            'pause_threshold': pause_threshold,
+            'voice_energy_threshold': 0.01,
+            'min_recording_duration': min_recording_duration,
+            'pause_detection_enabled': True
+        },
+        'wake_word': {'sample_rate': SAMPLE_RATE}
+    }
+    return PauseDetector(config)
+
+
+def block(amplitude, seed=0):
+    """Блок int16 шума с заданной амплитудой"""
+    rng = np.random.default_rng(seed)
+    return rng.integers(-amplitude, amplitude + 1, BLOCK).astype(np.int16)
+
+
+SILENCE = block(30)
+SPEECH = block(8000)
+
+
+class TestPauseDetector:
+    """Тесты для PauseDetector"""
+
+    def test_first_chunk_calibrates_noise_level(self):
+        """Тест калибровки уровня шума по первому чанку"""
+        detector = make_detector()
+
+        assert detector.is_voice_detected(SILENCE)
+        assert detector.noise_level is not None
+        assert not detector.is_voice_detected(SILENCE)
+        assert detector.is_voice_detected(SPEECH)
+
+    def test_stops_after_pause_threshold(self):
+        """Тест остановки после pause_threshold секунд тишины"""
+        detector = make_detector(pause_threshold=1.0)
+        detector.should_stop_recording(SPEECH, 1.0)  # калибровка
+
+        # 1.0 с = 4 блока по 0.25 с: остановка ровно на четвертом
+        stops = [detector.should_stop_recording(SILENCE, 1.0) for _ in range(4)]
+
+        assert stops == [False, False, False, True]
+
+    def test_voice_resets_silence(self):
+        """Тест сброса счетчика тишины при голосе"""
+        detector = make_detector(pause_threshold=1.0)
+        detector.should_stop_recording(SILENCE, 1.0)  # калибровка
+
+        for _ in range(3):
+            assert not detector.should_stop_recording(SILENCE, 1.0)
+        assert not detector.should_stop_recording(SPEECH, 1.0)
+        assert detector.silence_samples == 0
+
+        stops = [detector.should_stop_recording(SILENCE, 1.0) for _ in range(4)]
+        assert stops == [False, False, False, True]
+
+    def test_nothing_evaluated_before_min_duration(self):
+        """Тест: до min_recording_duration чанки не анализируются"""
+        detector = make_detector(pause_threshold=0.25, min_recording_duration=0.5)
+
+        for _ in range(10):
+            assert not detector.should_stop_recording(SILENCE, 0.4)
+
+        assert detector.silence_samples == 0
+        assert detector.noise_level is None
+
+    def test_steady_background_treated_as_silence(self):
+        """Тест: постоянный фон громче фиксированного порога не считается голосом"""
+        detector = make_detector(pause_threshold=1.0)
+        background = block(600)  # RMS ~0.01 - на уровне voice_energy_threshold
+        detector.should_stop_recording(background, 1.0)  # калибровка по фону
+
+        stops = [detector.should_stop_recording(block(600, seed=i), 1.0) for i in range(1, 5)]
+
+        assert stops == [False, False, False, True]
+
+    def test_reset_clears_state(self):
+        """Тест сброса состояния между записями"""
+        detector = make_detector()
+        detector.should_stop_recording(SPEECH, 1.0)
+        detector.should_stop_recording(SILENCE, 1.0)
+
+        detector.reset()
+
+        assert detector.silence_samples == 0
+        assert detector.noise_level is None
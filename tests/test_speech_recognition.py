@@ -0,0 +1,114 @@
+"""
+Tests for speech recognition audio preparation
+"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("soundfile")
+pytest.importorskip("faster_whisper")
+pytest.importorskip("scipy")
+
+from core.speech_recognition import SpeechRecognizer, TranscriptionStream
+
+
+class TestEnsure16kMono:
+    """Тесты для SpeechRecognizer._ensure_16k_mono"""
+
+    def test_int16_scaled_to_unit_range(self):
+        """Тест: int16 запись масштабируется в [-1, 1), а не просто меняет тип"""
+        audio = np.array([0, 16384, -32768, 32767], dtype=np.int16)
+
+        result = SpeechRecognizer._ensure_16k_mono(audio, 16000)
+
+        assert result.dtype == np.float32
+        np.testing.assert_allclose(result, [0.0, 0.5, -1.0, 32767 / 32768], rtol=1e-6)
+
+    def test_int16_resampled_and_mixed_to_mono(self):
+        """Тест: многоканальная int16 запись с другой частотой тоже масштабируется"""
+        audio = np.full((4800, 2), 16384, dtype=np.int16)
+
+        result = SpeechRecognizer._ensure_16k_mono(audio, 48000)
+
+        assert result.ndim == 1
+        assert len(result) == 1600
+        assert np.abs(result).max() <= 1.0
+
+    def test_float32_passed_through(self):
+        """Тест: float32 16 кГц моно используется без копии"""
+        audio = np.linspace(-1, 1, 160, dtype=np.float32)
+
+        assert SpeechRecognizer._ensure_16k_mono(audio, 16000) is audio
+
+
+class RecordingModel:
+    """Модель-заглушка: запоминает опции вызова transcribe и ничего не распознает"""
+
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, **options):
+        self.calls.append(options)
+        return iter(()), None
+
+
+class TestDecodingOptions:
+    """Тесты опций декодирования пакетного и последовательного пути"""
+
+    def make_recognizer(self):
+        recognizer = SpeechRecognizer({"transcription": {"language": "ru"}})
+        recognizer.whisper_model = RecordingModel()
+        recognizer.batched_model = RecordingModel()
+        return recognizer
+
+    def test_batched_path_uses_same_decoding_options(self):
+        """Тест: пакетный путь получает те же опции декодирования, что и последовательный"""
+        recognizer = self.make_recognizer()
+        audio = np.zeros(1600, dtype=np.float32)
+
+        list(recognizer._transcribe_segments(audio, 16000))
+        recognizer.batched_interactive = True
+        list(recognizer._transcribe_segments(audio, 16000))
+
+        sequential = recognizer.whisper_model.calls[0]
+        batched = recognizer.batched_model.calls[0]
+        for option, value in recognizer._decoding_options().items():
+            assert sequential[option] == value
+            assert batched[option] == value
+        assert batched["condition_on_previous_text"] is False
+
+    def test_warmup_covers_batched_model(self):
+        """Тест: при batched_interactive прогревается и пакетная модель"""
+        recognizer = self.make_recognizer()
+        recognizer.batched_interactive = True
+
+        recognizer._warmup()
+
+        assert recognizer.batched_model.calls
+
+
+class FakeRecognizer:
+    """Распознаватель без модели: хранит только настройку сохранения записей"""
+
+    def __init__(self, save_audio_files):
+        self.save_audio_files = save_audio_files
+
+
+class TestTranscriptionStream:
+    """Тесты для TranscriptionStream"""
+
+    def test_recording_not_kept_without_saving(self):
+        """Тест: без save_audio_files копия всей записи не накапливается"""
+        stream = TranscriptionStream(FakeRecognizer(save_audio_files=False), 16000, 0)
+        stream.feed(np.zeros(1600, dtype=np.int16))
+
+        assert stream._chunks == []
+        assert stream._pending_len == 1600
+
+    def test_recording_kept_for_saving(self):
+        """Тест: при save_audio_files запись сохраняется целиком"""
+        stream = TranscriptionStream(FakeRecognizer(save_audio_files=True), 16000, 0)
+        stream.feed(np.zeros(1600, dtype=np.int16))
+        stream.feed(np.zeros(800, dtype=np.int16))
+
+        assert sum(len(chunk) for chunk in stream._chunks) == 2400
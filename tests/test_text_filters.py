@@ -16,7 +16,9 @@ from utils.text_filters import (
     filter_reasoning_blocks,
     clean_llm_response,
     has_thinking_blocks,
-    extract_thinking_content
+    extract_thinking_content,
+    ThinkingStreamFilter,
+    SentenceSplitter
 )
 
 
@@ -252,6 +254,68 @@ Python - отличный язык для начинающих.
         self.assertIn("простой синтаксис", cleaned)
 
 
+class TestThinkingStreamFilter(unittest.TestCase):
+    """Тесты для потоковой фильтрации thinking-блоков"""
+
+    def _feed_all(self, chunks):
+        stream_filter = ThinkingStreamFilter()
+        output = "".join(stream_filter.feed(chunk) for chunk in chunks)
+        return output + stream_filter.flush()
+
+    def test_plain_text_passes_through(self):
+        """Тест передачи текста без блоков"""
+        stream_filter = ThinkingStreamFilter()
+        self.assertEqual(stream_filter.feed("Привет, "), "Привет, ")
+        self.assertEqual(stream_filter.feed("мир!"), "мир!")
+        self.assertEqual(stream_filter.flush(), "")
+
+    def test_block_split_across_chunks(self):
+        """Тест удаления блока, разбитого на несколько чанков"""
+        chunks = ["<thi", "nk>Рассуж", "дение</th", "ink>Ответ."]
+        self.assertEqual(self._feed_all(chunks), "Ответ.")
+
+    def test_text_held_while_block_open(self):
+        """Тест удержания текста внутри незакрытого блока"""
+        stream_filter = ThinkingStreamFilter()
+        self.assertEqual(stream_filter.feed("Да. <reasoning>внутри"), "Да. ")
+        self.assertEqual(stream_filter.feed(" еще</reasoning> Нет."), " Нет.")
+
+    def test_case_insensitive_tags(self):
+        """Тест нечувствительности к регистру"""
+        self.assertEqual(self._feed_all(["<THINKING>x</thinking>Ок"]), "Ок")
+
+    def test_non_tag_angle_bracket(self):
+        """Тест обычного символа '<' в тексте"""
+        self.assertEqual(self._feed_all(["2 <", " 3 и <b>"]), "2 < 3 и <b>")
+
+    def test_unclosed_block_flushed(self):
+        """Тест незакрытого блока в конце потока"""
+        self.assertEqual(self._feed_all(["<think>обрыв"]), "<think>обрыв")
+
+
+class TestSentenceSplitter(unittest.TestCase):
+    """Тесты для разбиения потока на предложения"""
+
+    def test_sentences_emitted_when_complete(self):
+        """Тест выдачи предложений по мере завершения"""
+        splitter = SentenceSplitter()
+        self.assertEqual(splitter.feed("Привет! Как "), ["Привет!"])
+        self.assertEqual(splitter.feed("дела? Все"), ["Как дела?"])
+        self.assertEqual(splitter.flush(), "Все")
+
+    def test_number_not_split(self):
+        """Тест отсутствия разбиения внутри чисел"""
+        splitter = SentenceSplitter()
+        self.assertEqual(splitter.feed("Сейчас 3.5 градуса."), [])
+        self.assertEqual(splitter.flush(), "Сейчас 3.5 градуса.")
+
+    def test_ellipsis(self):
+        """Тест многоточия как конца предложения"""
+        splitter = SentenceSplitter()
+        self.assertEqual(splitter.feed("Хм… Ладно. "), ["Хм…", "Ладно."])
+        self.assertIsNone(splitter.flush())
+
+
 def run_tests():
     """Запуск всех тестов"""
     # Создаем test suite
@@ -264,6 +328,8 @@ def run_tests():
     suite.addTests(loader.loadTestsFromTestCase(TestComprehensiveCleaning))
     suite.addTests(loader.loadTestsFromTestCase(TestUtilityFunctions))
     suite.addTests(loader.loadTestsFromTestCase(TestRealWorldScenarios))
+    suite.addTests(loader.loadTestsFromTestCase(TestThinkingStreamFilter))
+    suite.addTests(loader.loadTestsFromTestCase(TestSentenceSplitter))
 
     # Запускаем тесты
     runner = unittest.TextTestRunner(verbosity=2)
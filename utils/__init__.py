@@ -2,13 +2,18 @@
 Utility modules for Speech Assistant application.
 """
 
-from .audio_utils import calculate_energy, convert_float32_to_int16
+from .audio_utils import (AudioRingBuffer, calculate_energy, convert_float32_to_int16, float32_to_int16,
+                          int16_to_float32, mean_square_energy)
 from .config import load_config
 from .enums import AssistantState
 
 __all__ = [
     'AssistantState',
+    'AudioRingBuffer',
     'load_config',
     'calculate_energy',
-    'convert_float32_to_int16'
+    'convert_float32_to_int16',
+    'float32_to_int16',
+    'int16_to_float32',
+    'mean_square_energy'
 ]
\ No newline at end of file
@@ -2,20 +2,221 @@
 Audio utilities and helper functions for the Speech Assistant application.
 """
 
+import math
+
 import numpy as np
 
+try:
+    from numba import njit
+except ImportError:  # numba не установлен - используем реализацию на NumPy
+    njit = None
+
+# Масштаб int16 PCM к диапазону [-1.0, 1.0] для квадрата амплитуды
+_INT16_SCALE_SQ = 32768.0 * 32768.0
+
+
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def _mean_square_f32(x):
+        """Средний квадрат амплитуды float32 буфера за один проход"""
+        total = 0.0
+        for i in range(x.shape[0]):
+            total += x[i] * x[i]
+        return total / x.shape[0]
+
+    @njit(cache=True)
+    def _mean_square_i16(x):
+        """Средний квадрат амплитуды int16 буфера, приведенный к [-1.0, 1.0]"""
+        total = 0
+        for i in range(x.shape[0]):
+            sample = np.int64(x[i])
+            total += sample * sample
+        return total / (x.shape[0] * _INT16_SCALE_SQ)
+
+    @njit(cache=True, fastmath=True)
+    def _scale_to_int16(x, out):
+        """Клиппинг, масштабирование и сужение до int16 за один проход"""
+        for i in range(x.shape[0]):
+            sample = x[i]
+            if sample > 1.0:
+                sample = 1.0
+            elif sample < -1.0:
+                sample = -1.0
+            out[i] = np.int16(sample * 32767.0)
+
+    @njit(cache=True)
+    def _ingest_pcm(ring, write_pos, x):
+        """Запись int16 блока в кольцевой буфер и средний квадрат амплитуды за один проход"""
+        size = ring.shape[0]
+        pos = write_pos
+        total = 0
+        for i in range(x.shape[0]):
+            sample = x[i]
+            value = np.int64(sample)
+            total += value * value
+            if size:
+                ring[pos] = sample
+                pos += 1
+                if pos == size:
+                    pos = 0
+        if x.shape[0] == 0:
+            return pos, 0.0
+        return pos, total / (x.shape[0] * _INT16_SCALE_SQ)
+else:
+    def _mean_square_f32(x):
+        """Средний квадрат амплитуды float32 буфера"""
+        return float(np.dot(x, x)) / x.shape[0]
+
+    def _mean_square_i16(x):
+        """Средний квадрат амплитуды int16 буфера, приведенный к [-1.0, 1.0]"""
+        samples = x.astype(np.int64)
+        return float(np.dot(samples, samples)) / (x.shape[0] * _INT16_SCALE_SQ)
+
+    def _scale_to_int16(x, out):
+        """Клиппинг и масштабирование во временном буфере, сужение сразу в out"""
+        scaled = np.clip(x, -1.0, 1.0)
+        np.multiply(scaled, 32767, out=scaled)
+        np.copyto(out, scaled, casting='unsafe')
+
+    def _ingest_pcm(ring, write_pos, x):
+        """Запись int16 блока в кольцевой буфер и средний квадрат амплитуды"""
+        pos = write_ring_buffer(ring, write_pos, x)
+        return pos, (_mean_square_i16(x) if x.shape[0] else 0.0)
+
+
+def mean_square_energy(audio_chunk):
+    """
+    Вычисляет средний квадрат амплитуды аудио чанка (квадрат RMS, без корня).
+
+    Для сравнения с порогом T достаточно сравнить результат с T ** 2.
+    Буфер не копируется: int16 считается в целых числах без перевода во float,
+    срезы каналов (indata[:, 0]) обрабатываются как есть, без выравнивания в памяти.
+
+    Args:
+        audio_chunk: numpy array с аудио данными (float32 или int16)
+                     или сырые байты int16 PCM
+
+    Returns:
+        float: средний квадрат амплитуды (int16 приводится к диапазону [-1.0, 1.0])
+    """
+    if isinstance(audio_chunk, (bytes, bytearray, memoryview)):
+        audio = np.frombuffer(audio_chunk, dtype=np.int16)
+    else:
+        audio = np.asarray(audio_chunk)
+    if audio.size == 0:
+        return 0.0
+
+    if audio.ndim != 1:
+        audio = audio.reshape(-1)
+
+    if audio.dtype == np.int16:
+        return float(_mean_square_i16(audio))
+
+    if audio.dtype != np.float32:
+        audio = audio.astype(np.float32)
+    return float(_mean_square_f32(audio))
+
 
 def calculate_energy(audio_chunk):
     """
     Вычисляет RMS энергию аудио чанка.
 
     Args:
-        audio_chunk: numpy array с аудио данными
+        audio_chunk: numpy array с аудио данными (float32 или int16)
+                     или сырые байты int16 PCM
+
+    Returns:
+        float: RMS энергия сигнала (int16 приводится к диапазону [-1.0, 1.0])
+    """
+    return math.sqrt(mean_square_energy(audio_chunk))
+
+
+def float32_to_int16(audio_data, out=None):
+    """
+    Конвертирует аудио из float32 в int16 PCM массив.
+
+    Клиппинг в диапазон [-1.0, 1.0], масштабирование и сужение выполняются
+    за один проход (с numba), исходный массив не изменяется. Переданный out
+    позволяет переиспользовать буфер между вызовами из аудио колбэка.
+
+    Args:
+        audio_data: numpy array в формате float32
+        out: необязательный int16 массив той же длины для результата
 
     Returns:
-        float: RMS энергия сигнала
+        numpy array int16
     """
-    return np.sqrt(np.mean(audio_chunk**2))
+    audio = np.asarray(audio_data)
+    if audio.ndim != 1:
+        audio = audio.reshape(-1)
+    if out is None:
+        out = np.empty(audio.shape[0], dtype=np.int16)
+    _scale_to_int16(audio, out)
+    return out
+
+
+def write_ring_buffer(ring, write_pos, audio_data):
+    """
+    Записывает аудио в кольцевой буфер срезами, без поэлементного цикла.
+
+    Args:
+        ring: numpy array фиксированного размера
+        write_pos: текущая позиция записи
+        audio_data: numpy array с новыми сэмплами
+
+    Returns:
+        int: новая позиция записи (там же лежит самый старый сэмпл)
+    """
+    size = ring.shape[0]
+    n = len(audio_data)
+    if size == 0:
+        return 0
+    if n >= size:
+        # Данных больше, чем помещается - остаются только последние сэмплы
+        ring[:] = audio_data[n - size:]
+        return 0
+
+    end = write_pos + n
+    if end <= size:
+        ring[write_pos:end] = audio_data
+    else:
+        head = size - write_pos
+        ring[write_pos:] = audio_data[:head]
+        ring[:n - head] = audio_data[head:]
+    return end % size
+
+
+def ingest_pcm_chunk(ring, write_pos, pcm):
+    """
+    Добавляет int16 блок в кольцевой буфер и одновременно считает его энергию.
+
+    С numba запись и суммирование квадратов выполняются одним циклом: каждый
+    сэмпл читается из памяти один раз. Без numba - срез NumPy и скалярное произведение.
+
+    Args:
+        ring: int16 кольцевой буфер
+        write_pos: текущая позиция записи
+        pcm: одномерный numpy array int16
+
+    Returns:
+        (новая позиция записи, средний квадрат амплитуды в диапазоне [-1.0, 1.0])
+    """
+    pos, energy_sq = _ingest_pcm(ring, write_pos, pcm)
+    return int(pos), float(energy_sq)
+
+
+def int16_to_float32(audio_data, out=None):
+    """
+    Конвертирует аудио из int16 PCM в float32 в диапазоне [-1.0, 1.0).
+
+    Args:
+        audio_data: numpy array int16
+        out: необязательный float32 массив той же длины для результата
+
+    Returns:
+        numpy array float32
+    """
+    return np.multiply(audio_data, np.float32(1.0 / 32768.0), out=out, dtype=np.float32)
 
 
 def convert_float32_to_int16(audio_data):
@@ -28,6 +229,71 @@ def convert_float32_to_int16(audio_data):
     Returns:
         bytes: аудио данные в формате int16
     """
-    # Клиппинг аудио данных в диапазон [-1.0, 1.0] перед конвертацией
-    clipped_audio = np.clip(audio_data, -1.0, 1.0)
-    return (clipped_audio * 32767).astype(np.int16).tobytes()
\ No newline at end of file
+    return float32_to_int16(audio_data).tobytes()
+
+
+class AudioRingBuffer:
+    """
+    Кольцевой буфер с одним писателем и одним читателем (SPSC) без блокировок.
+
+    Писатель (аудио колбэк PortAudio) только копирует сэмплы в заранее выделенный
+    массив, читатель (рабочий поток) забирает их блоками. Счетчики записи и чтения
+    меняет каждый только свой поток, а присваивание атрибута под GIL атомарно,
+    поэтому блокировки не нужны. Емкость округляется до степени двойки, чтобы
+    позиция вычислялась маской.
+    """
+
+    def __init__(self, min_capacity, dtype=np.float32):
+        capacity = 1 << max(1, int(min_capacity) - 1).bit_length()
+        self._buffer = np.zeros(capacity, dtype=dtype)
+        self._mask = capacity - 1
+        self._head = 0  # всего записано сэмплов (меняет только писатель)
+        self._tail = 0  # всего прочитано сэмплов (меняет только читатель)
+        self.dropped = 0  # сэмплы, не поместившиеся в буфер
+
+    @property
+    def capacity(self):
+        return self._mask + 1
+
+    def __len__(self):
+        return self._head - self._tail
+
+    def push(self, samples):
+        """
+        Добавляет сэмплы (вызывается только писателем).
+
+        Returns:
+            bool: False если места не хватило и блок отброшен
+        """
+        n = len(samples)
+        head = self._head
+        if n > self.capacity - (head - self._tail):
+            self.dropped += n
+            return False
+
+        start = head & self._mask
+        first = min(n, self.capacity - start)
+        self._buffer[start:start + first] = samples[:first]
+        self._buffer[:n - first] = samples[first:]
+        # Публикуем запись только после копирования данных
+        self._head = head + n
+        return True
+
+    def pop_into(self, out):
+        """
+        Забирает len(out) сэмплов в out (вызывается только читателем).
+
+        Returns:
+            bool: False если накоплено меньше len(out) сэмплов
+        """
+        n = len(out)
+        tail = self._tail
+        if self._head - tail < n:
+            return False
+
+        start = tail & self._mask
+        first = min(n, self.capacity - start)
+        out[:first] = self._buffer[start:start + first]
+        out[first:] = self._buffer[:n - first]
+        self._tail = tail + n
+        return True
@@ -14,6 +14,11 @@ class WakeWordKeys:
     KEYWORDS = 'keywords'
     MODEL_PATH = 'model_path'
     PRE_TRIGGER_DURATION = 'pre_trigger_duration'
+    ENERGY_GATE = 'energy_gate'
+    ENERGY_GATE_HANGOVER = 'energy_gate_hangover'
+    GRAMMAR_ONLY = 'grammar_only'
+    DECODE_BATCH_SIZE = 'decode_batch_size'
+    DETECT_ON_PARTIAL = 'detect_on_partial'
 
 
 # Text-to-speech configuration keys
@@ -23,6 +28,11 @@ class TTSKeys:
     TTS_SAMPLE_RATE = 'tts_sample_rate'
     TTS_SPEAKER = 'tts_speaker'
     USE_ACCENTIZER = 'use_accentizer'
+    TTS_MODEL_PATH = 'tts_model_path'
+    TTS_HALF_PRECISION = 'tts_half_precision'
+    TTS_COMPILE = 'tts_compile'
+    TTS_WARMUP = 'tts_warmup'
+    QUANTIZE_TTS = 'quantize_tts'
     MAX_RECORDING_DURATION = 'max_recording_duration'
 
 
@@ -33,8 +43,17 @@ class TranscriptionKeys:
     WHISPER_MODEL = 'whisper_model'
     DEVICE = 'device'
     COMPUTE_TYPE = 'compute_type'
+    DOWNLOAD_ROOT = 'download_root'
+    NUM_WORKERS = 'num_workers'
     LANGUAGE = 'language'
     BEAM_SIZE = 'beam_size'
+    BEAM_QUALITY_MODE = 'beam_quality_mode'
+    BATCH_SIZE = 'batch_size'
+    BATCHED_INTERACTIVE = 'batched_interactive'
+    VAD_FILTER = 'vad_filter'
+    VAD_PARAMETERS = 'vad_parameters'
+    WARMUP = 'warmup'
+    STREAM_WINDOW = 'stream_window'
 
 
 # Voice detection configuration keys
@@ -55,6 +74,15 @@ class LLMKeys:
     BASE_URL = 'base_url'
     MODEL = 'model'
     TEMPERATURE = 'temperature'
+    MAX_TOKENS = 'max_tokens'
+    STOP = 'stop'
+    TOP_P = 'top_p'
+    MAX_CONTEXT_TOKENS = 'max_context_tokens'
+    KEEP_LAST_N = 'keep_last_n'
+    PREFILL_ON_PARTIAL = 'prefill_on_partial'
+    EMITS_THINKING = 'emits_thinking'
+    WARMUP = 'warmup'
+    RESPONSE_CACHE_TTL = 'response_cache_ttl'
 
 
 # Configuration sections (string identifiers)
@@ -0,0 +1,45 @@
+"""
+Device detection helpers shared by speech recognition and speech synthesis.
+"""
+
+import functools
+
+
+@functools.lru_cache(maxsize=1)
+def best_device():
+    """
+    Возвращает устройство для моделей: CUDA если доступна, иначе CPU.
+
+    Проверка CUDA инициализирует драйвер (до сотен миллисекунд), поэтому
+    выполняется один раз на процесс и разделяется между модулями.
+
+    Returns:
+        torch.device
+    """
+    import torch
+
+    try:
+        if torch.cuda.is_available():
+            return torch.device('cuda')
+    except Exception:
+        pass
+    return torch.device('cpu')
+
+
+@functools.lru_cache(maxsize=None)
+def supported_compute_types(device):
+    """
+    Возвращает типы вычислений CTranslate2, поддерживаемые устройством.
+
+    Args:
+        device: 'cuda' или 'cpu'
+
+    Returns:
+        frozenset: поддерживаемые типы (пустой, если узнать не удалось)
+    """
+    import ctranslate2
+
+    try:
+        return frozenset(ctranslate2.get_supported_compute_types(device))
+    except Exception:
+        return frozenset()
@@ -3,7 +3,10 @@ Unified logging module for the Speech Assistant application.
 Provides centralized logging configuration and emoji-enhanced formatters.
 """
 
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 from typing import Optional
 
@@ -52,27 +55,34 @@ class AssistantLogger:
             formatter = logging.Formatter('%(levelname)s - %(name)s - %(message)s')
 
         console_handler.setFormatter(formatter)
-        self.logger.addHandler(console_handler)
 
-    def debug(self, message: str):
-        """Отладочное сообщение"""
-        self.logger.debug(message)
-
-    def info(self, message: str):
-        """Информационное сообщение"""
-        self.logger.info(message)
-
-    def warning(self, message: str):
-        """Предупреждение"""
-        self.logger.warning(message)
-
-    def error(self, message: str):
-        """Ошибка"""
-        self.logger.error(message)
-
-    def critical(self, message: str):
-        """Критическая ошибка"""
-        self.logger.critical(message)
+        # Запись в консоль выполняет отдельный поток: вызовы логгера из аудио
+        # потоков и потоков синтеза не ждут вывода в stdout
+        log_queue = queue.SimpleQueue()
+        self.logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        self._listener = logging.handlers.QueueListener(log_queue, console_handler, respect_handler_level=True)
+        self._listener.start()
+        atexit.register(self._listener.stop)
+
+    def debug(self, message: str, *args):
+        """Отладочное сообщение (аргументы подставляются в message только если сообщение выводится)"""
+        self.logger.debug(message, *args)
+
+    def info(self, message: str, *args):
+        """Информационное сообщение (аргументы подставляются в message только если сообщение выводится)"""
+        self.logger.info(message, *args)
+
+    def warning(self, message: str, *args):
+        """Предупреждение (аргументы подставляются в message только если сообщение выводится)"""
+        self.logger.warning(message, *args)
+
+    def error(self, message: str, *args):
+        """Ошибка (аргументы подставляются в message только если сообщение выводится)"""
+        self.logger.error(message, *args)
+
+    def critical(self, message: str, *args):
+        """Критическая ошибка (аргументы подставляются в message только если сообщение выводится)"""
+        self.logger.critical(message, *args)
 
 
 # Создаем глобальный экземпляр логгера
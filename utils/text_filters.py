@@ -6,7 +6,7 @@ such as thinking blocks, internal reasoning, and other meta-content.
 """
 
 import re
-from typing import Optional
+from typing import List, Optional
 
 
 # Global patterns for all thinking/reasoning tags that different LLM models might use
@@ -19,6 +19,21 @@ THINKING_PATTERNS = [
     r'<meta>.*?</meta>',
 ]
 
+# Compiled once at import: filtering runs on every LLM response
+_THINKING_RES = [re.compile(pattern, re.DOTALL | re.IGNORECASE) for pattern in THINKING_PATTERNS]
+_THINKING_CAPTURE_RES = [
+    re.compile(pattern.replace('.*?', '(.*?)'), re.DOTALL | re.IGNORECASE)
+    for pattern in THINKING_PATTERNS
+]
+_EXTRA_NEWLINES_RE = re.compile(r'\n\s*\n\s*\n+')
+
+# Opening tags of the same blocks, used by the streaming filter
+THINKING_OPEN_TAG_RE = re.compile(r'<(thinking|think|reasoning|analysis|internal|meta)>', re.IGNORECASE)
+_THINKING_OPEN_TAGS = ('<thinking>', '<think>', '<reasoning>', '<analysis>', '<internal>', '<meta>')
+
+# Sentence boundary: terminal punctuation followed by whitespace
+SENTENCE_END_RE = re.compile(r'(?<=[.!?…])\s+')
+
 
 def filter_thinking_blocks(text: str, remove_empty_lines: bool = True) -> str:
     """
@@ -56,13 +71,15 @@ def filter_thinking_blocks(text: str, remove_empty_lines: bool = True) -> str:
 
     cleaned_text = text
 
-    # Apply all thinking/reasoning patterns to ensure comprehensive filtering
-    for pattern in THINKING_PATTERNS:
-        cleaned_text = re.sub(pattern, '', cleaned_text, flags=re.DOTALL | re.IGNORECASE)
+    # Apply all thinking/reasoning patterns to ensure comprehensive filtering;
+    # without any '<' none of them can match, so skip the scans entirely
+    if '<' in cleaned_text:
+        for pattern_re in _THINKING_RES:
+            cleaned_text = pattern_re.sub('', cleaned_text)
 
     if remove_empty_lines:
         # Clean up multiple consecutive newlines
-        cleaned_text = re.sub(r'\n\s*\n\s*\n+', '\n\n', cleaned_text)
+        cleaned_text = _EXTRA_NEWLINES_RE.sub('\n\n', cleaned_text)
 
         # Remove leading/trailing whitespace
         cleaned_text = cleaned_text.strip()
@@ -154,12 +171,12 @@ def has_thinking_blocks(text: str) -> bool:
     Returns:
         True if any thinking blocks are found, False otherwise
     """
-    if not text:
+    if not text or '<' not in text:
         return False
 
     # Check for any of the thinking/reasoning patterns
-    for pattern in THINKING_PATTERNS:
-        if re.search(pattern, text, flags=re.DOTALL | re.IGNORECASE):
+    for pattern_re in _THINKING_RES:
+        if pattern_re.search(text):
             return True
 
     return False
@@ -180,18 +197,128 @@ def extract_thinking_content(text: str) -> list[str]:
     Returns:
         List of thinking block contents (without tags)
     """
-    if not text:
+    if not text or '<' not in text:
         return []
 
     all_matches = []
 
     # Extract content from all thinking/reasoning patterns
-    for pattern in THINKING_PATTERNS:
-        # Convert pattern to capture group format
-        # e.g., r'<thinking>.*?</thinking>' -> r'<thinking>(.*?)</thinking>'
-        capture_pattern = pattern.replace('.*?', '(.*?)')
-        matches = re.findall(capture_pattern, text, flags=re.DOTALL | re.IGNORECASE)
-        all_matches.extend(matches)
+    # (capture variants, e.g. r'<thinking>(.*?)</thinking>')
+    for capture_re in _THINKING_CAPTURE_RES:
+        all_matches.extend(capture_re.findall(text))
 
     # Clean up the extracted content
-    return [match.strip() for match in all_matches]
\ No newline at end of file
+    return [match.strip() for match in all_matches]
+
+
+class ThinkingStreamFilter:
+    """
+    Incremental variant of filter_thinking_blocks() for streamed LLM output.
+
+    Text outside thinking/reasoning blocks is returned as soon as it arrives;
+    text inside a block is held back until the closing tag is seen and then
+    dropped. A possible partial opening tag at the end of a chunk is buffered
+    until the next chunk resolves it.
+
+    Examples:
+        >>> stream_filter = ThinkingStreamFilter()
+        >>> stream_filter.feed('<thi') + stream_filter.feed('nk>hmm</think>Hello')
+        'Hello'
+    """
+
+    def __init__(self):
+        self._buffer = ''
+
+    def feed(self, chunk: str) -> str:
+        """
+        Adds a chunk of streamed text.
+
+        Args:
+            chunk: Next piece of the LLM response
+
+        Returns:
+            Text that is known to be outside thinking blocks (may be empty)
+        """
+        self._buffer += chunk
+        output = []
+
+        while self._buffer:
+            match = THINKING_OPEN_TAG_RE.search(self._buffer)
+            if match is None:
+                cut = self._buffer.rfind('<')
+                if cut != -1 and _is_open_tag_prefix(self._buffer[cut:]):
+                    output.append(self._buffer[:cut])
+                    self._buffer = self._buffer[cut:]
+                else:
+                    output.append(self._buffer)
+                    self._buffer = ''
+                break
+
+            output.append(self._buffer[:match.start()])
+            close_tag = f'</{match.group(1).lower()}>'
+            close_index = self._buffer.lower().find(close_tag, match.end())
+            if close_index == -1:
+                # Block is not closed yet - wait for more chunks
+                self._buffer = self._buffer[match.start():]
+                break
+            self._buffer = self._buffer[close_index + len(close_tag):]
+
+        return ''.join(output)
+
+    def flush(self) -> str:
+        """
+        Returns whatever is left in the buffer at the end of the stream.
+
+        An unclosed block is returned as-is, matching filter_thinking_blocks()
+        which only removes complete blocks.
+        """
+        rest, self._buffer = self._buffer, ''
+        return rest
+
+
+def _is_open_tag_prefix(text: str) -> bool:
+    """Checks if text may be the beginning of a thinking block opening tag"""
+    text_lower = text.lower()
+    return any(tag.startswith(text_lower) for tag in _THINKING_OPEN_TAGS)
+
+
+class SentenceSplitter:
+    """
+    Splits streamed text into complete sentences.
+
+    A sentence is emitted only after its terminal punctuation (.!?…) is
+    followed by whitespace, so abbreviations and numbers such as "3.5" are
+    not split while the next token is still pending.
+
+    Examples:
+        >>> splitter = SentenceSplitter()
+        >>> splitter.feed('Привет! Как ')
+        ['Привет!']
+        >>> splitter.feed('дела?')
+        []
+        >>> splitter.flush()
+        'Как дела?'
+    """
+
+    def __init__(self):
+        self._buffer = ''
+
+    def feed(self, chunk: str) -> List[str]:
+        """
+        Adds a chunk of streamed text.
+
+        Args:
+            chunk: Next piece of text
+
+        Returns:
+            List of sentences completed by this chunk
+        """
+        self._buffer += chunk
+        parts = SENTENCE_END_RE.split(self._buffer)
+        self._buffer = parts.pop()
+        return [part.strip() for part in parts if part.strip()]
+
+    def flush(self) -> Optional[str]:
+        """Returns the trailing incomplete sentence, if any"""
+        rest, self._buffer = self._buffer.strip(), ''
+        return rest or None
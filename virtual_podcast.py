@@ -298,6 +298,10 @@ def main():
             traceback.print_exc()
         return 1
 
+    finally:
+        if 'llm_engine' in locals():
+            llm_engine.shutdown()
+
 
 if __name__ == "__main__":
     try: